@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+'''
+benchmarks for the code that runs every control loop tick.
+
+    python Test/benchmark.py
+    python Test/benchmark.py --save Test/benchmark-baseline.json
+    python Test/benchmark.py --baseline Test/benchmark-baseline.json --max-regression 1.25
+
+prints the time per call and the peak memory allocated during a single
+call for each benchmark. with --baseline, exits non-zero if any
+benchmark got slower than the baseline by more than --max-regression.
+baselines are only comparable on the same hardware.
+'''
+import os
+import sys
+import json
+import time
+import datetime
+import argparse
+import tracemalloc
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(script_dir, '..'))
+sys.path.insert(0, os.path.join(script_dir, '..', 'lib'))
+
+import config
+from oven import Profile, PID, TempTracker, SimulatedOven
+from ovenWatcher import OvenWatcher
+
+
+class NullSocket(object):
+    '''stands in for a websocket, throws away whatever is sent'''
+    def send(self, message):
+        pass
+
+
+def big_profile(points=500):
+    '''a long profile with lots of points, like an imported crystal glaze'''
+    data = [[i * 120, 100 + (i % 50) * 40] for i in range(points)]
+    return Profile(json.dumps({"name": "benchmark", "data": data}))
+
+
+def bench_profile_target():
+    profile = big_profile()
+    duration = profile.get_duration()
+    state = {"runtime": 0}
+    def fn():
+        # sequential ticks, like a running kiln
+        state["runtime"] = (state["runtime"] + config.sensor_time_wait) % duration
+        profile.get_target_temperature(state["runtime"])
+    return fn
+
+
+def bench_pid_compute():
+    pid = PID(ki=config.pid_ki, kd=config.pid_kd, kp=config.pid_kp)
+    state = {"now": datetime.datetime.now()}
+    step = datetime.timedelta(seconds=config.sensor_time_wait)
+    def fn():
+        state["now"] += step
+        # inside the pid control window so all terms are computed
+        pid.compute(1000, 1000 - config.pid_control_window / 2, state["now"])
+    return fn
+
+
+def bench_temptracker():
+    tracker = TempTracker()
+    state = {"i": 0}
+    def fn():
+        state["i"] += 1
+        tracker.add(1000 + (state["i"] % 7))
+        tracker.get_avg_temp()
+    return fn
+
+
+def make_oven():
+    oven = SimulatedOven(headless=True)
+    oven.run_profile(big_profile())
+    return oven
+
+
+def bench_get_state():
+    oven = make_oven()
+    def fn():
+        oven.get_state()
+    return fn
+
+
+def make_watcher(oven, samples):
+    watcher = OvenWatcher(oven, headless=True)
+    watcher.last_profile = oven.profile
+    for i in range(samples):
+        oven.runtime = i * oven.time_step
+        watcher.history.append(oven.get_state())
+    return watcher
+
+
+def bench_lastlog_subset(samples):
+    watcher = make_watcher(make_oven(), samples)
+    def fn():
+        watcher.lastlog_subset()
+    return fn
+
+
+def bench_notify_all(observers):
+    oven = make_oven()
+    watcher = make_watcher(oven, 0)
+    for i in range(observers):
+        watcher.add_observer(NullSocket())
+    def fn():
+        watcher.notify_all(oven.get_state())
+    return fn
+
+
+def measure(fn, seconds=0.5, repeat=5):
+    '''returns (seconds per call, peak bytes allocated by one call)'''
+    # warm up and work out how many calls fit in the time
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for i in range(calls):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed > seconds / repeat:
+            break
+        calls *= 2
+
+    best = None
+    for r in range(repeat):
+        start = time.perf_counter()
+        for i in range(calls):
+            fn()
+        per_call = (time.perf_counter() - start) / calls
+        if best is None or per_call < best:
+            best = per_call
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    return best, peak
+
+
+def benchmarks(args):
+    return [
+        ("Profile.get_target_temperature", bench_profile_target),
+        ("PID.compute", bench_pid_compute),
+        ("TempTracker.add+get_avg_temp", bench_temptracker),
+        ("Oven.get_state", bench_get_state),
+        ("OvenWatcher.lastlog_subset(%d)" % args.samples, lambda: bench_lastlog_subset(args.samples)),
+        ("OvenWatcher.notify_all(%d)" % args.observers, lambda: bench_notify_all(args.observers)),
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the control loop hot paths')
+    parser.add_argument('--seconds', type=float, default=0.5, help="time to spend on each benchmark")
+    parser.add_argument('--samples', type=int, default=25000, help="samples in the watcher log, 25000 is about a 14 hour firing")
+    parser.add_argument('--observers', type=int, default=10, help="websocket clients for notify_all")
+    parser.add_argument('--only', type=str, default=None, help="only run benchmarks with this in their name")
+    parser.add_argument('--save', type=str, default=None, help="save results as a baseline json file")
+    parser.add_argument('--baseline', type=str, default=None, help="compare against this baseline json file")
+    parser.add_argument('--max-regression', type=float, default=1.25, help="fail if a benchmark is this many times slower than the baseline")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as infile:
+            baseline = json.load(infile)
+
+    results = {}
+    failed = []
+    print("%-40s %12s %12s %10s" % ("benchmark", "usec/call", "bytes/call", "baseline"))
+    for name, setup in benchmarks(args):
+        if args.only and args.only not in name:
+            continue
+        per_call, peak = measure(setup(), seconds=args.seconds)
+        usec = per_call * 1e6
+        results[name] = {"usec": usec, "bytes": peak}
+
+        compared = ""
+        if name in baseline:
+            ratio = usec / baseline[name]["usec"]
+            compared = "%.2fx" % ratio
+            if ratio > args.max_regression:
+                compared += " FAIL"
+                failed.append(name)
+        print("%-40s %12.2f %12d %10s" % (name, usec, peak, compared))
+
+    if args.save:
+        with open(args.save, 'w') as outfile:
+            json.dump(results, outfile, indent=4, sort_keys=True)
+        print("saved baseline to %s" % args.save)
+
+    if failed:
+        print("%d benchmark(s) slower than %.2fx baseline: %s" % (len(failed), args.max_regression, ", ".join(failed)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# kiln-controller.py puts lib/ on the path and the modules in lib import
+# each other by name (from oven import Profile), so do the same for tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'lib')))
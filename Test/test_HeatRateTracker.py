@@ -0,0 +1,32 @@
+import pytest
+from oven import SlopeWindow, HeatRateTracker
+
+
+def test_slope_of_a_line():
+    window = SlopeWindow(horizon=60, capacity=100)
+    assert window.slope() == 0
+    for t in range(0, 1000, 2):
+        window.add(t, 100 + 0.5 * t)
+    assert window.slope() == pytest.approx(0.5)
+    # only the last 60 seconds are kept
+    assert window.samples[0][0] >= 1000 - 2 - 60
+
+
+def test_horizons():
+    tracker = HeatRateTracker([60, 600], time_step=2)
+    # 100 degrees/hour for 20 minutes, then flat for 2 minutes
+    for t in range(0, 1200, 2):
+        tracker.add(t, t * 100 / 3600)
+    for t in range(1200, 1320, 2):
+        tracker.add(t, 1200 * 100 / 3600)
+    rates = tracker.rates()
+    assert rates[60] == pytest.approx(0)
+    assert 0 < rates[600] < 100
+
+
+def test_repeated_times_ignored():
+    window = SlopeWindow(horizon=60, capacity=10)
+    window.add(5, 100)
+    window.add(5, 200)
+    assert len(window.samples) == 1
+    assert window.slope() == 0
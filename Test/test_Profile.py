@@ -42,8 +42,10 @@ def test_find_time_odd_profile():
     time = profile.find_next_time_from_temperature(500)
     assert time == 4200
 
+    # the schedule passes 2023 on the way up to 2250 and again after
+    # cooling to 2000, the earliest one wins
     time = profile.find_next_time_from_temperature(2023)
-    assert time == 16676.0
+    assert round(time, 6) == round(10800 + (2023 - 500) * 3600 / 1750, 6)
 
 
 def test_find_x_given_y_on_line_from_two_points():
@@ -78,3 +80,51 @@ def test_find_x_given_y_on_line_from_two_points():
     assert time == 0
 
 
+
+def test_get_target_temperature_in_order_and_random():
+    profile = get_profile("test-cases.json")
+
+    def slow_target(time):
+        # straight line between the two points either side of time
+        for i in range(1, len(profile.data)):
+            (t1, y1), (t2, y2) = profile.data[i-1], profile.data[i]
+            if t1 <= time < t2:
+                return y1 + (time - t1) * (y2 - y1) / (t2 - t1)
+
+    for time in range(0, 19400, 7):
+        assert abs(profile.get_target_temperature(time) - slow_target(time)) < 1e-9
+
+    for time in [16676, 12, 19399, 4200, 4199, 3600, 10800]:
+        assert abs(profile.get_target_temperature(time) - slow_target(time)) < 1e-9
+
+
+def test_get_target_temperature_end_of_schedule():
+    profile = get_profile()
+
+    assert profile.get_duration() == 19400
+    assert round(profile.get_target_temperature(19400), 6) == 700
+    assert profile.get_target_temperature(19401) == 0
+
+
+def test_get_target_temperatures():
+    profile = get_profile("test-cases.json")
+
+    times = list(range(-10, 19500, 13)) + [19400, 3600]
+    temps = profile.get_target_temperatures(times)
+
+    assert len(temps) == len(times)
+    for time, temp in zip(times, temps):
+        assert abs(temp - profile.get_target_temperature(time)) < 1e-9
+
+
+def test_find_time_from_temperature_holds_and_limits():
+    profile = get_profile("test-cases.json")
+
+    # reaching a hold temperature seeks to the start of the hold
+    assert profile.find_next_time_from_temperature(500) == 4200
+    assert profile.find_next_time_from_temperature(2250) == 14400
+
+    # starts at or above, or never reaches the temperature
+    assert profile.find_next_time_from_temperature(150) == 0
+    assert profile.find_next_time_from_temperature(200) == 0
+    assert profile.find_next_time_from_temperature(2251) == 0
@@ -0,0 +1,154 @@
+from profileStore import ProfileStore, ProfileError, validate_profile
+from oven import Profile
+import profileStore
+import pytest
+import os
+import json
+
+def write_profile(path, name, data, temp_units="c"):
+    filepath = os.path.join(path, name + ".json")
+    with open(filepath, 'w') as f:
+        json.dump({"name": name, "type": "profile", "data": data, "temp_units": temp_units}, f)
+    return filepath
+
+
+def test_get_profiles_json(tmp_path, monkeypatch):
+    monkeypatch.setattr(profileStore.config, "temp_scale", "f")
+    write_profile(tmp_path, "b", [[0, 100], [3600, 1000]])
+    write_profile(tmp_path, "a", [[0, 0], [3600, 100]])
+
+    store = ProfileStore(str(tmp_path))
+    profiles = json.loads(store.get_profiles_json())
+
+    assert [p["name"] for p in profiles] == ["a", "b"]
+    # stored in c, served in config.temp_scale
+    assert profiles[0]["data"] == [[0, 32], [3600, 212]]
+    assert profiles[0]["temp_units"] == "f"
+
+
+def test_only_changed_files_are_reloaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(profileStore.config, "temp_scale", "c")
+    write_profile(tmp_path, "a", [[0, 0], [3600, 100]])
+    filepath = write_profile(tmp_path, "b", [[0, 100], [3600, 1000]])
+
+    store = ProfileStore(str(tmp_path))
+    first = store.get_profiles_json()
+    assert store.get_profiles_json() is first
+
+    write_profile(tmp_path, "b", [[0, 100], [7200, 1000], [9000, 1000]])
+    st = os.stat(filepath)
+    os.utime(filepath, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+    profiles = json.loads(store.get_profiles_json())
+    assert profiles[1]["data"] == [[0, 100], [7200, 1000], [9000, 1000]]
+
+    write_profile(tmp_path, "c", [[0, 0], [60, 10]])
+    os.remove(os.path.join(tmp_path, "a.json"))
+    profiles = json.loads(store.get_profiles_json())
+    assert [p["name"] for p in profiles] == ["b", "c"]
+
+
+def test_bad_profile_is_skipped(tmp_path):
+    write_profile(tmp_path, "a", [[0, 0], [3600, 100]])
+    with open(os.path.join(tmp_path, "broken.json"), 'w') as f:
+        f.write("{not json")
+
+    with open(os.path.join(tmp_path, "nameless.json"), 'w') as f:
+        json.dump({"type": "profile", "data": [[0, 0], [60, 10]]}, f)
+
+    store = ProfileStore(str(tmp_path))
+    first = store.get_profiles_json()
+    assert [p["name"] for p in json.loads(first)] == ["a"]
+    assert store.get_profile("a").name == "a"
+
+    # the broken files are not read again until they change
+    assert store.get_profiles_json() is first
+
+
+def test_get_profile(tmp_path, monkeypatch):
+    monkeypatch.setattr(profileStore.config, "temp_scale", "c")
+    write_profile(tmp_path, "a", [[3600, 100], [0, 0]])
+    filepath = write_profile(tmp_path, "b", [[0, 100], [3600, 1000]])
+
+    store = ProfileStore(str(tmp_path))
+    profile = store.get_profile("a")
+    assert profile.name == "a"
+    assert profile.data == [[0, 0], [3600, 100]]
+    assert profile.get_target_temperature(1800) == 50
+    assert store.get_profile("a") is profile
+    assert store.get_profile("missing") is None
+
+    # a changed file is picked up on the next lookup
+    write_profile(tmp_path, "b", [[0, 100], [7200, 1000]])
+    st = os.stat(filepath)
+    os.utime(filepath, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+    assert store.get_profile("b").get_duration() == 7200
+
+    os.remove(filepath)
+    assert store.get_profile("b") is None
+
+
+def test_validate_profile(monkeypatch):
+    monkeypatch.setattr(profileStore.config, "temp_scale", "c")
+    profile = validate_profile({"name": "a", "type": "profile",
+        "data": [[3600, 100], [0, 0], [3600, 100], [7200, 100]]})
+
+    assert profile["temp_units"] == "c"
+    assert profile["data"] == [[0, 0], [3600, 100], [7200, 100]]
+    assert profile["compiled"]["slopes"] == [100/3600, 0]
+    assert profile["compiled"]["duration"] == 7200
+
+    # the browser sends config.temp_scale
+    monkeypatch.setattr(profileStore.config, "temp_scale", "f")
+    profile = validate_profile({"name": "a", "data": [[0, 32], [3600, 212]]})
+    assert profile["temp_units"] == "c"
+    assert profile["compiled"]["temps"] == [0, 100]
+
+
+def test_validate_profile_errors():
+    bad = [
+        {"data": [[0, 0], [60, 100]]},
+        {"name": "../../etc/x", "data": [[0, 0], [60, 100]]},
+        {"name": "a", "data": [[0, 0]]},
+        {"name": "a", "data": [[0, 0], [60, "hot"]]},
+        {"name": "a", "data": [[0, 0], [60, float("nan")]]},
+        {"name": "a", "data": [[0, 0], [-60, 100]]},
+        {"name": "a", "data": [[0, 0], [60, 100], [60, 200]]},
+        {"name": "a", "data": [[0, 0], [0, 0]]},
+        {"name": "a", "data": [[0, 0], [60, 100]], "temp_units": "k"},
+    ]
+    for profile in bad:
+        with pytest.raises(ProfileError):
+            validate_profile(profile)
+
+
+def test_saved_profile_loads_compiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(profileStore.config, "temp_scale", "f")
+    profile = validate_profile({"name": "a", "data": [[0, 50], [3600, 212], [7200, 1000], [9000, 100]]})
+    with open(os.path.join(tmp_path, "a.json"), 'w') as f:
+        json.dump(profile, f)
+
+    store = ProfileStore(str(tmp_path))
+    loaded = store.get_profile("a")
+    fresh = Profile({"name": "a", "data": loaded.data})
+    assert "compiled" not in json.loads(store.get_profiles_json())[0]
+    for time in range(0, 9000, 17):
+        assert abs(loaded.get_target_temperature(time) - fresh.get_target_temperature(time)) < 1e-9
+
+
+def test_compiled_in_other_units_is_not_used(monkeypatch):
+    monkeypatch.setattr(profileStore.config, "temp_scale", "c")
+    profile = validate_profile({"name": "a", "data": [[0, 0], [3600, 100]]})
+
+    # only the points converted to f, the compiled copy is still in c
+    profile["data"] = [[0, 32], [3600, 212]]
+    profile["temp_units"] = "f"
+    assert Profile(profile).get_target_temperature(3600) == 212
+
+
+def test_stale_compiled_is_not_used(monkeypatch):
+    monkeypatch.setattr(profileStore.config, "temp_scale", "c")
+    profile = validate_profile({"name": "a", "data": [[0, 0], [3600, 1000], [7200, 1000]]})
+
+    # the hold edited by hand without touching the compiled copy
+    profile["data"] = [[0, 0], [3600, 500], [7200, 500]]
+    assert Profile(profile).get_target_temperature(5000) == 500
@@ -0,0 +1,64 @@
+import os
+import json
+from lib.oven import ReplayOven, Profile
+from kilnTrace import load_trace
+
+
+def get_profile(file = "test-fast.json"):
+    profile_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Test', file))
+    with open(profile_path) as infile:
+        profile_json = json.dumps(json.load(infile))
+    return Profile(profile_json)
+
+
+def write_log(path, temps, faults_at=()):
+    '''a daemon.log with a temperature every 2 seconds, and a burst of
+    not connected faults before each tick in faults_at'''
+    with open(path, "w") as out:
+        for tick, temp in enumerate(temps):
+            stamp = "Jan  1 00:00:00 kiln python[350]: 2024-01-01 %02d:%02d:%02d,000" % (tick * 2 // 3600, tick * 2 // 60 % 60, tick * 2 % 60)
+            if tick in faults_at:
+                for i in range(8):
+                    out.write("%s ERROR oven: Problem reading temp not connected\n" % stamp)
+            out.write("%s ERROR oven: Problem reading temp (ignored) cold junction range fault\n" % stamp)
+            out.write("%s INFO oven: temp=%.2f, target=200.00, error=0.00, pid=0.50, p=0.00, i=0.00, d=0.00, heat_on=1.00, heat_off=1.00, run_time=%d, total_time=19400, time_left=0\n" % (stamp, temp, tick * 2))
+
+
+def test_replay_runs_to_the_end_of_the_trace(tmp_path):
+    path = str(tmp_path / "daemon.log")
+    write_log(path, [70 + tick for tick in range(300)])
+    trace = load_trace(path)
+    assert len(trace) == 300
+    assert trace.duration() == 598
+    assert trace.fault_count() == 300
+
+    oven = ReplayOven(trace)
+    samples = oven.simulate(get_profile())
+    assert oven.outcome == "stopped"
+    assert len(samples) == 299
+    assert samples[-1]['temperature'] == 369
+    metrics = oven.board.temp_sensor.status.get_metrics()
+    assert metrics["faults"]["cold junction range fault"]["ignored"] == 300
+
+
+def test_replay_stops_on_recorded_faults(tmp_path):
+    path = str(tmp_path / "daemon.log")
+    write_log(path, [70] * 100, faults_at=(50,))
+    oven = ReplayOven(load_trace(path))
+    samples = oven.simulate(get_profile())
+    assert oven.outcome == "emergency"
+    assert len(samples) == 50
+
+
+def test_logger_csv_with_faults_from_the_log(tmp_path):
+    log_path = str(tmp_path / "daemon.log")
+    write_log(log_path, [70] * 10, faults_at=(5,))
+    csv_path = str(tmp_path / "kilnstats.csv")
+    start = load_trace(log_path).times[0]
+    with open(csv_path, "w") as out:
+        out.write("stamp,runtime,temperature,target,state,heat,totaltime,profile\n")
+        for tick in range(10):
+            out.write("%f,0,%d,0,RUNNING,0,0,test\n" % (start + tick * 2 - 0.5, 100 + tick))
+    trace = load_trace(csv_path, log_path)
+    assert trace.temperatures[0] == 100
+    assert [len(f) for f in trace.faults] == [0, 1, 1, 1, 1, 1, 9, 1, 1, 1]
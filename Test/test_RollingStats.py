@@ -0,0 +1,38 @@
+import pytest
+from rollingStats import RollingStats
+
+
+def pidstats(err, out, dt=2):
+    return {"err": err, "out": out, "timeDelta": dt}
+
+
+def test_rolling_stats():
+    stats = RollingStats([60, 600], control_window=10)
+    assert stats.get() == {"60": None, "600": None}
+
+    # 10 minutes 5 degrees too cold with the elements half on
+    for i in range(300):
+        stats.add({"pidstats": pidstats(5, 0.5), "catching_up": False})
+    # then 1 minute 20 degrees too cold, catching up, elements full on
+    for i in range(30):
+        stats.add({"pidstats": pidstats(20, 1.0), "catching_up": True})
+
+    last_minute = stats.get()["60"]
+    assert last_minute["error"] == pytest.approx(-20)
+    assert last_minute["duty_cycle"] == pytest.approx(100)
+    assert last_minute["catching_up"] == pytest.approx(100)
+    assert last_minute["outside_window"] == pytest.approx(60)
+
+    ten_minutes = stats.get()["600"]
+    assert ten_minutes["error"] == pytest.approx(-6.5)
+    assert ten_minutes["duty_cycle"] == pytest.approx(55)
+    assert ten_minutes["outside_window_percent"] == pytest.approx(10)
+
+
+def test_same_pid_computation_counted_once():
+    stats = RollingStats([60], control_window=10)
+    p = pidstats(1, 0.2)
+    stats.add({"pidstats": p})
+    stats.add({"pidstats": p})
+    stats.add({"pidstats": {}})
+    assert stats.windows[0].sums[0] == 2
@@ -0,0 +1,48 @@
+from runArchive import RunArchive
+
+
+def state(i):
+    return {"runtime": i * 2, "temperature": 20 + i, "target": 25 + i,
+            "heat": 1.0, "heat_rate": None, "cost": 0.1 * i,
+            "catching_up": i % 2 == 0,
+            "pidstats": {"err": 5, "out": 0.5, "p": 1, "i": 2, "d": 3}}
+
+
+def test_record_and_read_back(tmp_path):
+    path = str(tmp_path / "runs.sqlite")
+    archive = RunArchive(path, commit_every=7)
+    first = archive.start_run("default", "cone-6", started=1000)
+    for i in range(100):
+        archive.add_sample(first, state(i), now=1000 + i * 2)
+    archive.end_run(first, "complete", ended=1200)
+    second = archive.start_run("small", "cone-05", started=2000)
+    archive.add_sample(second, state(0), now=2000)
+
+    runs = archive.list_runs()
+    assert [r["id"] for r in runs] == [second, first]
+    assert runs[1]["outcome"] == "complete"
+    assert runs[1]["sample_count"] == 100
+    assert runs[1]["max_temperature"] == 119
+    assert [r["id"] for r in archive.list_runs(before=2000)] == [first]
+    assert [r["id"] for r in archive.list_runs(profile="cone-05")] == [second]
+    assert [r["id"] for r in archive.list_runs(kiln="default")] == [first]
+
+    samples = archive.get_samples(first)
+    assert len(samples) == 100
+    assert samples[3]["temperature"] == 23
+    assert samples[3]["catching_up"] == False
+    assert samples[3]["pid_out"] == 0.5
+    assert len(archive.get_samples(first, maxpts=10)) <= 10
+    assert archive.get_samples(first, fields=["time", "target"])[0] == {"time": 1000, "target": 25}
+
+    # samples after a run ends are not added
+    archive.add_sample(first, state(0))
+    assert archive.get_run(first)["sample_count"] == 100
+    archive.close()
+
+    # a run that never ended was interrupted
+    archive = RunArchive(path)
+    assert archive.get_run(second)["outcome"] == "interrupted"
+    assert archive.get_run(second)["sample_count"] == 1
+    assert archive.get_run(12345) is None
+    archive.close()
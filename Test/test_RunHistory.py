@@ -0,0 +1,141 @@
+import os
+import runHistory
+from runHistory import RunHistory
+
+
+def state(i):
+    return {"runtime": i * 2, "temperature": 20 + i, "target": 25 + i,
+            "heat": 1.0, "heat_rate": None, "cost": 0.1 * i,
+            "catching_up": i % 2 == 0,
+            "pidstats": {"err": 5, "out": 0.5, "p": 1, "i": 2, "d": 3}}
+
+
+def test_append_and_rows():
+    history = RunHistory(max_samples=100)
+    for i in range(10):
+        history.append(state(i), now=1000 + i)
+    assert len(history) == 10
+    row = history.rows([3])[0]
+    assert row["runtime"] == 6
+    assert row["temperature"] == 23
+    assert row["time"] == 1003
+    assert row["catching_up"] == False
+    assert row["heat_rate"] is None
+    assert row["pid_out"] == 0.5
+    assert [r["runtime"] for r in history.rows([-1])] == [18]
+
+
+def test_spill_to_file(tmp_path, monkeypatch):
+    spill_file = str(tmp_path / "history" / "history-test.bin")
+    history = RunHistory(max_samples=10, spill_file=spill_file)
+    for i in range(25):
+        history.append(state(i), now=i)
+    assert len(history) == 25
+    assert len(history.columns["time"]) < 10
+    assert os.path.exists(spill_file)
+    rows = history.rows(range(25))
+    assert [r["temperature"] for r in rows] == [20 + i for i in range(25)]
+    assert rows[0]["catching_up"] == True
+
+    history.clear()
+    assert len(history) == 0
+    assert not os.path.exists(spill_file)
+
+    makedirs = runHistory.os.makedirs
+    failures = [OSError("disk full")]
+    def flaky_makedirs(*args, **kwargs):
+        if failures:
+            raise failures.pop()
+        return makedirs(*args, **kwargs)
+    monkeypatch.setattr(runHistory.os, "makedirs", flaky_makedirs)
+
+    # the first spill fails, later ones must not be taken for samples 0...
+    for i in range(25):
+        history.append(state(i), now=i)
+    assert len(history) == 25
+    for i in range(25):
+        rows = history.rows([i])
+        assert history.available(i) == bool(rows)
+        if rows:
+            assert rows[0]["time"] == i
+            assert rows[0]["temperature"] == 20 + i
+    assert history.find_time(3) == history.offset
+
+
+def test_no_spill_file_drops_oldest():
+    history = RunHistory(max_samples=10)
+    for i in range(25):
+        history.append(state(i), now=i)
+    assert len(history) == 25
+    rows = history.rows(range(25))
+    assert len(rows) < 10
+    assert rows[-1]["temperature"] == 44
+
+
+def test_decimated_keeps_spikes():
+    history = RunHistory(max_samples=100000, max_buckets=64)
+    for i in range(10000):
+        s = state(i)
+        s["temperature"] = 100
+        if i == 4321:
+            s["temperature"] = 500
+        if i == 7777:
+            s["temperature"] = 10
+        history.append(s, now=i)
+    assert len(history.min_index) <= 64
+    indices = history.decimated(50)
+    assert len(indices) <= 50
+    assert indices == sorted(indices)
+    assert indices[0] == 0 and indices[-1] == 9999
+    assert 4321 in indices
+    assert 7777 in indices
+
+    short = RunHistory()
+    for i in range(10):
+        short.append(state(i), now=i)
+    assert short.decimated(50) == list(range(10))
+
+
+def test_window(tmp_path):
+    spill_file = str(tmp_path / "history-test.bin")
+    history = RunHistory(max_samples=200, spill_file=spill_file, max_buckets=16)
+    for i in range(1000):
+        s = state(i)
+        s["temperature"] = 100
+        if i in (150, 620):
+            s["temperature"] = 900
+        history.append(s, now=1000 + i)
+
+    assert history.find_time(1150) == 150
+    assert history.find_time(1150, after=True) == 151
+    assert history.find_time(5000) == 1000
+
+    # small windows are returned whole, across the spill boundary too
+    assert history.window(1490, 1510, 50) == list(range(490, 511))
+    assert history.window(3000, 4000) == []
+
+    # large windows keep their spikes
+    for start, end in ((1100, 1700), (1140, 1160), (None, None)):
+        indices = history.window(start, end, 20)
+        assert len(indices) <= 20
+        assert 150 in indices
+    indices = history.window(1200, 1700, 20)
+    assert indices[0] == 200 and indices[-1] == 700
+    assert 620 in indices
+    assert 150 not in indices
+
+
+def test_window_keeps_spikes_at_the_edges():
+    history = RunHistory(max_samples=100000, max_buckets=16)
+    # a high and a low in the partly covered bucket at each end
+    spikes = {110: 900, 126: 10, 690: 900, 699: 10}
+    for i in range(1000):
+        s = state(i)
+        s["temperature"] = spikes.get(i, 100)
+        history.append(s, now=1000 + i)
+    assert history.bucket_width == 64
+
+    indices = history.window(1105, 1700, 8)
+    assert len(indices) <= 8
+    for i in spikes:
+        assert i in indices
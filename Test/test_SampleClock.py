@@ -0,0 +1,48 @@
+from oven import SampleClock
+
+
+class FakeTime(object):
+    def __init__(self):
+        self.t = 100.0
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        assert seconds >= 0
+        self.sleeps.append(seconds)
+        self.t += seconds
+
+
+def run_reads(clock, fake, read_times):
+    for read_time in read_times:
+        started = clock.start_read()
+        fake.t += read_time
+        clock.end_read(started)
+        clock.wait()
+
+
+def test_period_does_not_drift():
+    fake = FakeTime()
+    clock = SampleClock(0.2)
+    clock.now = lambda: fake.t
+    clock.sleep = fake.sleep
+    run_reads(clock, fake, [0.05] * 100)
+    # 100 reads take exactly 100 periods, however long each read took
+    assert abs(fake.t - (100.0 + 100 * 0.2)) < 1e-9
+    metrics = clock.get_metrics()
+    assert metrics["samples"] == 100
+    assert metrics["missed"] == 0
+    assert abs(metrics["interval"] - 0.2) < 1e-9
+    assert abs(metrics["read_latency"] - 0.05) < 1e-9
+
+
+def test_slow_reads_miss_deadlines():
+    fake = FakeTime()
+    clock = SampleClock(0.2)
+    clock.now = lambda: fake.t
+    clock.sleep = fake.sleep
+    run_reads(clock, fake, [0.05, 0.45, 0.05])
+    metrics = clock.get_metrics()
+    assert metrics["missed"] == 2
+    assert abs(metrics["read_latency_max"] - 0.45) < 1e-9
+    # still on the original schedule
+    assert abs((fake.t - 100.0) / 0.2 - round((fake.t - 100.0) / 0.2)) < 1e-9
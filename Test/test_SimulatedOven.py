@@ -0,0 +1,44 @@
+from lib.oven import SimulatedOven, Profile
+import os
+import json
+import time
+
+def get_profile(file = "test-fast.json"):
+    profile_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Test', file))
+    with open(profile_path) as infile:
+        profile_json = json.dumps(json.load(infile))
+    return Profile(profile_json)
+
+
+def test_simulate_whole_profile_headless():
+    oven = SimulatedOven(headless=True)
+    profile = get_profile()
+
+    started = time.time()
+    trace = oven.simulate(profile)
+    elapsed = time.time() - started
+
+    assert oven.is_alive() == False
+    assert oven.state == "IDLE"
+    assert len(trace) > profile.get_duration() / oven.time_step
+    assert trace[-1]['runtime'] > profile.get_duration()
+
+    # the simulated kiln should follow the schedule to the top
+    peak = max(trace, key=lambda s: s['temperature'])
+    assert abs(peak['temperature'] - 2250) < 50
+
+    # way faster than real time
+    assert elapsed < 60
+
+
+def test_simulate_uses_given_gains():
+    oven = SimulatedOven(headless=True)
+    profile = get_profile()
+
+    trace1 = oven.simulate(profile, kp=1, ki=1000, kd=0)
+    trace2 = oven.simulate(profile, kp=1, ki=1000, kd=0)
+    trace3 = oven.simulate(profile, kp=40, ki=20, kd=400)
+
+    # same gains, same result every time
+    assert trace1 == trace2
+    assert trace1 != trace3
@@ -0,0 +1,154 @@
+import time
+import json
+import threading
+import pytest
+import wireFormat
+from statusHub import StatusHub
+
+
+class FakeSocket(object):
+    def __init__(self, block=None, fail=False):
+        self.sent = []
+        self.block = block
+        self.fail = fail
+
+    def send(self, message):
+        if self.fail:
+            raise IOError("gone")
+        if self.block:
+            self.block.wait()
+        self.sent.append(message)
+
+
+def wait_for(check, timeout=2):
+    end = time.time() + timeout
+    while time.time() < end:
+        if check():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_publish_to_all():
+    hub = StatusHub(max_queue=10)
+    a = FakeSocket()
+    b = FakeSocket()
+    hub.subscribe(a, "backlog")
+    hub.subscribe(b)
+    hub.publish({"n": 1})
+    hub.publish({"n": 2})
+    assert wait_for(lambda: len(a.sent) == 3 and len(b.sent) == 2)
+    assert a.sent == ["backlog", '{"n": 1}', '{"n": 2}']
+    assert b.sent == ['{"n": 1}', '{"n": 2}']
+
+
+def test_slow_client_drops_oldest():
+    hub = StatusHub(max_queue=3)
+    block = threading.Event()
+    slow = FakeSocket(block=block)
+    fast = FakeSocket()
+    hub.subscribe(slow)
+    hub.subscribe(fast)
+    hub.publish({"n": 0})
+    # the slow client is now stuck sending "0"
+    assert wait_for(lambda: len(hub.clients[slow].queue) == 0)
+    for i in range(1, 10):
+        hub.publish({"n": i})
+    # the fast client is not held up by the slow one
+    assert wait_for(lambda: fast.sent[-1:] == ['{"n": 9}'])
+    block.set()
+    assert wait_for(lambda: len(slow.sent) == 4)
+    assert [json.loads(m)["n"] for m in slow.sent] == [0, 7, 8, 9]
+    assert hub.clients[slow].dropped == 6
+
+
+def test_failed_client_unsubscribed():
+    hub = StatusHub()
+    bad = FakeSocket(fail=True)
+    hub.subscribe(bad)
+    hub.publish({"n": 0})
+    assert wait_for(lambda: len(hub) == 0)
+    good = FakeSocket()
+    hub.subscribe(good)
+    hub.unsubscribe(good)
+    assert len(hub) == 0
+
+
+def test_delta_protocol():
+    hub = StatusHub(max_queue=2)
+    block = threading.Event()
+    block.set()
+    sock = FakeSocket(block=block)
+    hub.subscribe(sock, delta=True)
+    hub.publish({"temperature": 100, "kwh_rate": 0.1})
+    hub.publish({"temperature": 101, "kwh_rate": 0.1})
+    assert wait_for(lambda: len(sock.sent) == 2)
+    snapshot, delta = [json.loads(m) for m in sock.sent]
+    assert snapshot["type"] == "snapshot"
+    assert snapshot["state"] == {"temperature": 100, "kwh_rate": 0.1}
+    assert delta["type"] == "delta"
+    assert delta["seq"] == snapshot["seq"] + 1
+    assert delta["changed"] == {"temperature": 101}
+    assert delta["removed"] == []
+
+    # after a dropped message the client gets a snapshot again
+    block.clear()
+    hub.publish({"temperature": 102, "kwh_rate": 0.1})
+    assert wait_for(lambda: len(hub.clients[sock].queue) == 0)
+    for i in range(3, 6):
+        hub.publish({"temperature": 100 + i, "kwh_rate": 0.1})
+    block.set()
+    assert wait_for(lambda: len(sock.sent) == 5)
+    messages = [json.loads(m) for m in sock.sent[2:]]
+    assert [m["type"] for m in messages] == ["delta", "snapshot", "delta"]
+    assert messages[1]["state"]["temperature"] == 104
+    assert messages[2]["changed"] == {"temperature": 105}
+
+
+def test_binary_formats():
+    msgpack = pytest.importorskip("msgpack")
+    hub = StatusHub()
+    text = FakeSocket()
+    binary = FakeSocket()
+    binary_delta = FakeSocket()
+    hub.subscribe(text)
+    hub.subscribe(binary, fmt="msgpack")
+    hub.subscribe(binary_delta, delta=True, fmt="msgpack")
+    hub.publish({"temperature": 100.5})
+    assert wait_for(lambda: len(text.sent) and len(binary.sent) and len(binary_delta.sent))
+    assert text.sent == ['{"temperature": 100.5}']
+    assert msgpack.unpackb(binary.sent[0]) == {"temperature": 100.5}
+    snapshot = msgpack.unpackb(binary_delta.sent[0])
+    assert snapshot["type"] == "snapshot"
+    assert snapshot["state"] == {"temperature": 100.5}
+
+
+def test_choose_format(monkeypatch):
+    assert wireFormat.choose(None) == "json"
+    assert wireFormat.choose("json") == "json"
+    assert wireFormat.choose("nonsense") == "json"
+    monkeypatch.setattr(wireFormat, "msgpack", None)
+    assert wireFormat.choose("msgpack") == "json"
+    assert wireFormat.loads(b'{"cmd": "GET"}') == {"cmd": "GET"}
+
+
+def test_latest():
+    hub = StatusHub()
+    assert hub.latest() == (0, '{"seq": 0, "state": null}')
+    hub.publish({"temperature": 100})
+    hub.publish({"temperature": 100})
+    seq, body = hub.latest()
+    assert seq == 1
+    assert json.loads(body) == {"seq": 1, "state": {"temperature": 100}}
+    hub.publish({"temperature": 101})
+    assert hub.latest()[0] == 2
+
+
+def test_listener_called_on_change():
+    hub = StatusHub()
+    calls = []
+    hub.add_listener(lambda: calls.append(hub.latest()[0]))
+    hub.publish({"temperature": 100})
+    hub.publish({"temperature": 100})
+    hub.publish({"temperature": 101})
+    assert calls == [1, 2]
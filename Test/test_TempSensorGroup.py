@@ -0,0 +1,38 @@
+from kilns import KilnConfig
+from oven import TempSensorGroup, ThermocoupleTracker
+
+
+class FakeSensor(object):
+    def __init__(self, temp):
+        self.temp = temp
+        self.reads = 0
+        self.status = ThermocoupleTracker(size=10)
+
+    def read(self):
+        self.reads += 1
+
+    def temperature(self):
+        return self.temp
+
+
+def make_group(fusion, temps):
+    kiln_config = KilnConfig("test", {"thermocouple_fusion": fusion})
+    sensors = {"tc%d" % i: FakeSensor(t) for i, t in enumerate(temps)}
+    return TempSensorGroup(sensors, kiln_config)
+
+
+def test_fusion():
+    assert make_group("max", [100, 130, 110]).temperature() == 130
+    assert make_group("mean", [100, 130, 110]).temperature() == 340 / 3
+    assert make_group("median", [100, 130, 110]).temperature() == 110
+    assert make_group("median", [100, 130]).temperature() == 115
+    assert make_group("max", [100, 130]).temperatures() == {"tc0": 100, "tc1": 130}
+
+
+def test_any_bad_thermocouple_is_over_the_limit():
+    group = make_group("median", [100, 130, 110])
+    assert not group.status.over_error_limit()
+    for i in range(10):
+        group.sensors["tc1"].status.bad("not connected")
+    assert group.status.over_error_limit()
+    assert group.get_metrics()["sensors"]["tc1"]["thermocouple"]["error_percent"] == 100
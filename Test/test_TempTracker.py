@@ -0,0 +1,25 @@
+import random
+import statistics
+from oven import TempTracker
+
+
+def test_median_matches_statistics():
+    random.seed(1)
+    for size in (1, 2, 7, 50):
+        tracker = TempTracker(size=size)
+        window = [0] * size
+        for i in range(500):
+            temp = random.uniform(0, 1300)
+            if i % 10 == 0:
+                # repeated values
+                temp = 1000
+            tracker.add(temp, now=i)
+            window = window[1:] + [temp]
+            assert tracker.get_avg_temp() == statistics.median(window)
+
+
+def test_samples_oldest_first():
+    tracker = TempTracker(size=3)
+    for i in range(5):
+        tracker.add(100 + i, now=1000 + i)
+    assert tracker.samples() == [(1002, 102), (1003, 103), (1004, 104)]
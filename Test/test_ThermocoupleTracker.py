@@ -0,0 +1,36 @@
+from oven import ThermocoupleTracker
+
+
+def test_error_limit_and_fault_counts():
+    tracker = ThermocoupleTracker(size=10)
+    assert tracker.error_percent() == 0
+
+    for i in range(4):
+        tracker.bad("not connected")
+    tracker.ignored("cold junction range fault")
+    assert tracker.error_percent() == 40
+    assert tracker.over_error_limit()
+
+    # the faults leave the window but are still counted
+    for i in range(10):
+        tracker.good()
+    assert tracker.error_percent() == 0
+    assert not tracker.over_error_limit()
+
+    metrics = tracker.get_metrics()
+    assert metrics["reads"] == 15
+    assert metrics["faults"]["not connected"]["lifetime"] == 4
+    assert metrics["faults"]["not connected"]["window"] == 0
+    assert metrics["faults"]["cold junction range fault"]["ignored"] == 1
+    assert metrics["faults"]["cold junction range fault"]["lifetime"] == 1
+
+
+def test_window_rate():
+    tracker = ThermocoupleTracker(size=4)
+    tracker.bad("short circuit")
+    tracker.good()
+    tracker.bad()
+    metrics = tracker.get_metrics()
+    assert metrics["faults"]["short circuit"]["window_rate"] == 25
+    assert metrics["faults"]["unknown"]["window"] == 1
+    assert tracker.errors == 2
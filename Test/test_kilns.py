@@ -0,0 +1,37 @@
+import pytest
+from kilns import KilnConfig, kiln_configs
+import kilns
+import config
+
+
+def test_kiln_config_overrides():
+    kiln_config = KilnConfig("small", {"pid_kp": 1234})
+    assert kiln_config.pid_kp == 1234
+    assert kiln_config.pid_ki == config.pid_ki
+    assert hasattr(kiln_config, "no_such_setting") == False
+
+
+def test_kiln_configs(monkeypatch):
+    monkeypatch.setattr(kilns.config, "kilns", {})
+    configs = kiln_configs()
+    assert [kiln_id for (kiln_id, c) in configs] == ["default"]
+    assert configs[0][1].automatic_restart_state_file == config.automatic_restart_state_file
+
+    monkeypatch.setattr(kilns.config, "kilns", {"big": {}, "small": {"automatic_restart_state_file": "/x.json"}})
+    configs = dict(kiln_configs())
+    assert list(configs) == ["big", "small"]
+    assert configs["big"].automatic_restart_state_file.endswith("state-big.json")
+    assert configs["small"].automatic_restart_state_file == "/x.json"
+
+
+def test_kiln_configs_rejects_shared_settings(monkeypatch):
+    monkeypatch.setattr(kilns.config, "kilns", {"big": {"temp_scale": "c"}})
+    with pytest.raises(ValueError):
+        kiln_configs()
+
+
+def test_thermocouple_settings_per_kiln():
+    from oven import Max31855_Error, ThermocoupleTracker
+    kiln_config = KilnConfig("small", {"ignore_tc_lost_connection": True, "temperature_average_samples": 3})
+    assert Max31855_Error("thermocouple not connected", kiln_config).ignore
+    assert ThermocoupleTracker(kiln_config=kiln_config).size == 6
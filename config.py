@@ -276,3 +276,86 @@ kiln_profiles_directory = os.path.abspath(os.path.join(os.path.dirname( __file__
 # To prevent throttling, set throttle_percent to 100.
 throttle_below_temp = 300
 throttle_percent = 20
+
+########################################################################
+# heating rate
+# The heat rate is the least squares slope of the temperature over the
+# last few seconds, in degrees per hour. It is worked out for each of
+# heat_rate_horizons (in seconds). The web page shows the first one,
+# /status has all of them in heat_rates.
+heat_rate_horizons = [60, 600, 3600]
+
+########################################################################
+# more than one thermocouple
+# Big kilns can have a thermocouple in each zone, say top and bottom.
+# Each one needs its own chip select pin, they all share the SPI clock
+# and data pins above and must all be the same type (max31855 or
+# max31856). When thermocouples is set, spi_cs is not used. Each
+# thermocouple's temperature is sent to the browser, and the kiln
+# temperature is the thermocouple_fusion of them, one of...
+#   max    - the hottest, the safe choice so no part of the kiln overshoots
+#   median - the middle one, with 3 or more one bad thermocouple is ignored
+#   mean   - the average
+#thermocouples = { "top": board.D22, "bottom": board.D27 }
+thermocouples = {}
+thermocouple_fusion = "max"
+
+########################################################################
+# run history
+# The graph of the current firing that is sent to each browser when it
+# connects comes from a history of the firing kept in memory. At most
+# history_max_samples are kept in memory (7200 samples is 4 hours with
+# sensor_time_wait = 2). Older samples are moved to a file in
+# history_spill_directory so memory use stays flat on long firings.
+history_max_samples = 7200
+history_spill_directory = os.path.abspath(os.path.join(os.path.dirname( __file__ ),'storage','history'))
+
+########################################################################
+# rolling stats
+# /status includes the average error, duty cycle, percent of time catching
+# up and time outside pid_control_window over each of these windows (in
+# seconds) so every browser sees the same numbers.
+rolling_stats_windows = [60, 300, 900]
+
+########################################################################
+# run archive
+# Every firing is saved in this sqlite file, a row per sample, along with
+# the profile, when it started and ended and how it ended. See /api/runs.
+# Samples are written to disk every run_archive_commit_every samples (one
+# minute with sensor_time_wait = 2) to go easy on the sd card. Set
+# run_archive_file = None to turn this off.
+run_archive_file = os.path.abspath(os.path.join(os.path.dirname( __file__ ),'storage','runs.sqlite'))
+run_archive_commit_every = 30
+
+########################################################################
+# status websocket
+# Every browser watching a kiln gets its own queue of status messages.
+# If a browser falls behind, say a phone on bad wifi, the oldest waiting
+# messages are dropped once more than status_queue_size are waiting.
+# Slow browsers never delay the kiln or other browsers.
+status_queue_size = 10
+
+########################################################################
+# multiple kilns
+# One kiln-controller.py process can run more than one kiln. Each kiln
+# needs its own thermocouple board chip select (spi_cs) and its own
+# output to a relay (gpio_heat). The thermocouple boards share the SPI
+# clock and data pins. Any other setting in this file can be changed for
+# one kiln by adding it to that kiln's entry, for instance pid_kp,
+# emergency_shutoff_temp or simulate, except temp_scale and
+# kiln_profiles_directory which are the same for all kilns. Settings that
+# are not listed come from this file. Each kiln gets its own automatic
+# restart state file, state-<kiln id>.json, unless
+# automatic_restart_state_file is listed.
+#
+# The first kiln is the one used by /api, /status, /control and the web
+# page at /. Every kiln is also reachable at /kiln/<kiln id>/api,
+# /kiln/<kiln id>/status... and the web page at /?kiln=<kiln id>.
+# /api/kilns lists all kilns and their current state.
+#
+# Leave this empty to run a single kiln using the settings above.
+kilns = {}
+#kilns = {
+#    "big":   { "spi_cs": board.D22, "gpio_heat": board.D23 },
+#    "small": { "spi_cs": board.D5,  "gpio_heat": board.D24, "pid_kp": 20 },
+#}
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import time
+import math
 import os
 import sys
 import logging
@@ -8,6 +9,7 @@ import json
 
 import bottle
 import gevent
+import gevent.event
 import geventwebsocket
 #from bottle import post, get
 from gevent.pywsgi import WSGIServer
@@ -25,40 +27,210 @@ script_dir = os.path.dirname(os.path.realpath(__file__))
 sys.path.insert(0, script_dir + '/lib/')
 profile_path = config.kiln_profiles_directory
 
-from oven import SimulatedOven, RealOven, Profile
-from ovenWatcher import OvenWatcher
+from oven import Profile
+from profileStore import ProfileStore, ProfileError, validate_profile
+from kilns import build_kilns
+from runHistory import RunHistory
+from runArchive import RunArchive
+import wireFormat
+
+profile_store = ProfileStore(profile_path)
+
+run_archive = None
+if config.run_archive_file:
+    run_archive = RunArchive(config.run_archive_file, config.run_archive_commit_every)
 
 app = bottle.Bottle()
 
-if config.simulate == True:
-    log.info("this is a simulation")
-    oven = SimulatedOven()
-else:
-    log.info("this is a real kiln")
-    oven = RealOven()
-ovenWatcher = OvenWatcher(oven)
-# this ovenwatcher is used in the oven class for restarts
-oven.set_ovenwatcher(ovenWatcher)
+# every kiln has its own oven and watcher threads, see config.kilns
+kilns = build_kilns(profile_store, run_archive)
+default_kiln = next(iter(kilns.values()))
+
+class StateWaiters(object):
+    '''wakes the /api/state requests waiting on one kiln when its state
+    changes. the watcher publishes from its own thread, so it only pokes
+    the gevent loop, which then wakes the requests.'''
+    def __init__(self, hub):
+        self.changed = gevent.event.Event()
+        self.wakeup = gevent.get_hub().loop.async_()
+        self.wakeup.start(self.wake)
+        hub.add_listener(self.wakeup.send)
+
+    def wake(self):
+        changed = self.changed
+        self.changed = gevent.event.Event()
+        changed.set()
+
+state_waiters = {kiln_id: StateWaiters(kiln.watcher.observers) for kiln_id, kiln in kilns.items()}
+
+def get_kiln(kiln_id=None):
+    '''the kiln for a /kiln/<kiln_id>/... route, or the first kiln for
+    routes without a kiln_id'''
+    if kiln_id is None:
+        return default_kiln
+    if kiln_id not in kilns:
+        bottle.abort(404, "kiln %s not found" % kiln_id)
+    return kilns[kiln_id]
+
+def keep_query(url):
+    '''keep ?kiln=<kiln id> when redirecting to the web pages'''
+    if bottle.request.query_string:
+        return url + "?" + bottle.request.query_string
+    return url
 
 @app.route('/')
 def index():
-    return bottle.redirect('/picoreflow/index.html')
+    return bottle.redirect(keep_query('/picoreflow/index.html'))
 
 @app.route('/state')
 def state():
-    return bottle.redirect('/picoreflow/state.html')
+    return bottle.redirect(keep_query('/picoreflow/state.html'))
+
+@app.get('/api/kilns')
+def handle_kilns():
+    bottle.response.content_type = 'application/json'
+    return json.dumps([kiln.summary() for kiln in kilns.values()])
 
 @app.get('/api/stats')
-def handle_api():
+@app.get('/kiln/<kiln_id>/api/stats')
+def handle_api(kiln_id=None):
     log.info("/api/stats command received")
+    oven = get_kiln(kiln_id).oven
     if hasattr(oven,'pid'):
         if hasattr(oven.pid,'pidstats'):
             return json.dumps(oven.pid.pidstats)
 
 
+@app.get('/api/sensor')
+@app.get('/kiln/<kiln_id>/api/sensor')
+def handle_sensor(kiln_id=None):
+    '''how well the thermocouple is being read'''
+    oven = get_kiln(kiln_id).oven
+    bottle.response.content_type = 'application/json'
+    return json.dumps(oven.board.temp_sensor.get_metrics())
+
+@app.get('/api/state')
+@app.get('/kiln/<kiln_id>/api/state')
+def handle_state(kiln_id=None):
+    '''the newest kiln state, as sent on /status, with a seq number.
+    the etag is the seq, so If-None-Match gets a 304 if nothing changed.
+    wait_for_seq  - wait until seq is at least this, up to timeout seconds
+    timeout       - seconds to wait, 30 by default and at most 60
+    '''
+    kiln = get_kiln(kiln_id)
+    hub = kiln.watcher.observers
+    query = bottle.request.query
+    try:
+        wait_for_seq = int(query['wait_for_seq']) if query.get('wait_for_seq') else None
+        timeout = float(query.get('timeout', 30))
+    except ValueError:
+        bottle.abort(400, "wait_for_seq and timeout must be numbers")
+    if not math.isfinite(timeout):
+        bottle.abort(400, "timeout must be a number of seconds")
+    timeout = max(0, min(timeout, 60))
+
+    seq, body = hub.latest()
+    if wait_for_seq is not None:
+        deadline = time.time() + timeout
+        while True:
+            # take the event before looking at seq so a change in between
+            # is not missed
+            changed = state_waiters[kiln.id].changed
+            seq, body = hub.latest()
+            remaining = deadline - time.time()
+            if seq >= wait_for_seq or remaining <= 0:
+                break
+            changed.wait(remaining)
+
+    etag = '"%s-%d"' % (kiln.id, seq)
+    bottle.response.set_header('ETag', etag)
+    bottle.response.set_header('Cache-Control', 'no-cache')
+    if etag in [t.strip() for t in bottle.request.headers.get('If-None-Match', '').split(',')]:
+        return bottle.HTTPResponse(status=304, headers=dict(bottle.response.headers))
+    bottle.response.content_type = 'application/json'
+    return body
+
+@app.get('/api/history')
+@app.get('/kiln/<kiln_id>/api/history')
+def handle_history(kiln_id=None):
+    '''samples from the current or last firing.
+    from, to   - unix times, leave out for the start or end of the firing
+    points     - at most this many samples, highs and lows are kept
+    fields     - comma separated, leave out for all fields
+    '''
+    kiln = get_kiln(kiln_id)
+    query = bottle.request.query
+    try:
+        start = float(query['from']) if query.get('from') else None
+        end = float(query['to']) if query.get('to') else None
+        points = int(query.get('points', 500))
+    except ValueError:
+        bottle.abort(400, "from, to and points must be numbers")
+    points = max(2, min(points, 5000))
+    fields = [f for f in query.get('fields', '').split(',') if f]
+    unknown = [f for f in fields if f not in RunHistory.FIELDS]
+    if unknown:
+        bottle.abort(400, "unknown fields %s, use %s" % (",".join(unknown), ",".join(RunHistory.FIELDS)))
+
+    profile = kiln.watcher.last_profile
+    bottle.response.content_type = 'application/json'
+    return json.dumps({
+        "profile": profile.name if profile else None,
+        "samples": kiln.watcher.history_window(start, end, points, fields),
+    })
+
+@app.get('/api/runs')
+def handle_runs():
+    '''past firings, newest first.
+    limit      - at most this many runs, 100 by default
+    before     - only runs started before this unix time, for paging
+    profile    - only runs of this profile
+    kiln       - only runs of this kiln
+    '''
+    if not run_archive:
+        bottle.abort(404, "the run archive is turned off, see config.run_archive_file")
+    query = bottle.request.query
+    try:
+        limit = int(query.get('limit', 100))
+        before = float(query['before']) if query.get('before') else None
+    except ValueError:
+        bottle.abort(400, "limit and before must be numbers")
+    bottle.response.content_type = 'application/json'
+    return json.dumps(run_archive.list_runs(limit, before, query.get('profile'), query.get('kiln')))
+
+@app.get('/api/runs/<run_id:int>')
+def handle_run(run_id):
+    '''one past firing and its samples.
+    points     - at most this many samples, leave out for all of them
+    fields     - comma separated, leave out for all fields
+    '''
+    if not run_archive:
+        bottle.abort(404, "the run archive is turned off, see config.run_archive_file")
+    run = run_archive.get_run(run_id)
+    if run is None:
+        bottle.abort(404, "run %d not found" % run_id)
+    query = bottle.request.query
+    try:
+        points = int(query['points']) if query.get('points') else None
+    except ValueError:
+        bottle.abort(400, "points must be a number")
+    fields = [f for f in query.get('fields', '').split(',') if f]
+    unknown = [f for f in fields if f not in RunArchive.SAMPLE_FIELDS]
+    if unknown:
+        bottle.abort(400, "unknown fields %s, use %s" % (",".join(unknown), ",".join(RunArchive.SAMPLE_FIELDS)))
+    if fields and 'time' not in fields:
+        fields.insert(0, 'time')
+    run['samples'] = run_archive.get_samples(run_id, points, fields)
+    bottle.response.content_type = 'application/json'
+    return json.dumps(run)
+
 @app.post('/api')
-def handle_api():
+@app.post('/kiln/<kiln_id>/api')
+def handle_api(kiln_id=None):
     log.info("/api is alive")
+    kiln = get_kiln(kiln_id)
+    oven = kiln.oven
+    ovenWatcher = kiln.watcher
 
 
     # run a kiln schedule
@@ -82,9 +254,6 @@ def handle_api():
         if profile is None:
             return { "success" : False, "error" : "profile %s not found" % wanted }
 
-        # FIXME juggling of json should happen in the Profile class
-        profile_json = json.dumps(profile)
-        profile = Profile(profile_json)
         oven.run_profile(profile, startat=startat, allow_seek=allow_seek)
         ovenWatcher.record(profile)
 
@@ -116,18 +285,10 @@ def handle_api():
 
 def find_profile(wanted):
     '''
-    given a wanted profile name, find it and return the parsed
-    json profile object or None.
+    given a wanted profile name, find it and return a Profile
+    object or None.
     '''
-    #load all profiles from disk
-    profiles = get_profiles()
-    json_profiles = json.loads(profiles)
-
-    # find the wanted profile
-    for profile in json_profiles:
-        if profile['name'] == wanted:
-            return profile
-    return None
+    return profile_store.get_profile(wanted)
 
 @app.route('/picoreflow/:filename#.*#')
 def send_static(filename):
@@ -144,7 +305,11 @@ def get_websocket_from_request():
 
 
 @app.route('/control')
-def handle_control():
+@app.route('/kiln/<kiln_id>/control')
+def handle_control(kiln_id=None):
+    kiln = get_kiln(kiln_id)
+    oven = kiln.oven
+    ovenWatcher = kiln.watcher
     wsock = get_websocket_from_request()
     log.info("websocket (control) opened")
     while True:
@@ -185,6 +350,8 @@ def handle_control():
 @app.route('/storage')
 def handle_storage():
     wsock = get_websocket_from_request()
+    # /storage?encoding=msgpack or cbor replies in binary instead of json
+    fmt = wireFormat.choose(bottle.request.query.get('encoding'))
     log.info("websocket (storage) opened")
     while True:
         try:
@@ -194,19 +361,21 @@ def handle_storage():
             log.debug("websocket (storage) received: %s" % message)
 
             try:
-                msgdict = json.loads(message)
+                msgdict = wireFormat.loads(message, fmt)
             except:
                 msgdict = {}
+            if not isinstance(msgdict, dict):
+                msgdict = {}
 
             if message == "GET":
                 log.info("GET command received")
-                wsock.send(get_profiles())
+                wsock.send(get_profiles(fmt))
             elif msgdict.get("cmd") == "DELETE":
                 log.info("DELETE command received")
                 profile_obj = msgdict.get('profile')
                 if delete_profile(profile_obj):
                   msgdict["resp"] = "OK"
-                wsock.send(json.dumps(msgdict))
+                wsock.send(wireFormat.dumps(msgdict, fmt))
                 #wsock.send(get_profiles())
             elif msgdict.get("cmd") == "PUT":
                 log.info("PUT command received")
@@ -215,14 +384,19 @@ def handle_storage():
                 force = True
                 if profile_obj:
                     #del msgdict["cmd"]
-                    if save_profile(profile_obj, force):
-                        msgdict["resp"] = "OK"
-                    else:
-                        msgdict["resp"] = "FAIL"
+                    try:
+                        if save_profile(profile_obj, force):
+                            msgdict["resp"] = "OK"
+                        else:
+                            msgdict["resp"] = "FAIL"
+                    except ProfileError as e:
+                        log.error("Could not save profile: %s" % e)
+                        msgdict["resp"] = "ERROR"
+                        msgdict["error"] = str(e)
                     log.debug("websocket (storage) sent: %s" % message)
 
-                    wsock.send(json.dumps(msgdict))
-                    wsock.send(get_profiles())
+                    wsock.send(wireFormat.dumps(msgdict, fmt))
+                    wsock.send(get_profiles(fmt))
             time.sleep(1) 
         except WebSocketError:
             break
@@ -230,13 +404,15 @@ def handle_storage():
 
 
 @app.route('/config')
-def handle_config():
+@app.route('/kiln/<kiln_id>/config')
+def handle_config(kiln_id=None):
+    kiln = get_kiln(kiln_id)
     wsock = get_websocket_from_request()
     log.info("websocket (config) opened")
     while True:
         try:
             message = wsock.receive()
-            wsock.send(get_config())
+            wsock.send(get_config(kiln.config))
         except WebSocketError:
             break
         time.sleep(1)
@@ -244,9 +420,15 @@ def handle_config():
 
 
 @app.route('/status')
-def handle_status():
+@app.route('/kiln/<kiln_id>/status')
+def handle_status(kiln_id=None):
+    kiln = get_kiln(kiln_id)
     wsock = get_websocket_from_request()
-    ovenWatcher.add_observer(wsock)
+    # /status?protocol=delta sends only the fields that changed
+    delta = bottle.request.query.get('protocol') == 'delta'
+    # /status?encoding=msgpack or cbor sends binary instead of json
+    fmt = wireFormat.choose(bottle.request.query.get('encoding'))
+    kiln.watcher.add_observer(wsock, delta, fmt)
     log.info("websocket (status) opened")
     while True:
         try:
@@ -255,24 +437,17 @@ def handle_status():
         except WebSocketError:
             break
         time.sleep(1)
+    kiln.watcher.remove_observer(wsock)
     log.info("websocket (status) closed")
 
 
-def get_profiles():
-    try:
-        profile_files = os.listdir(profile_path)
-    except:
-        profile_files = []
-    profiles = []
-    for filename in profile_files:
-        with open(os.path.join(profile_path, filename), 'r') as f:
-            profiles.append(json.load(f))
-    profiles = normalize_temp_units(profiles)
-    return json.dumps(profiles)
+def get_profiles(fmt="json"):
+    return profile_store.get_profiles_encoded(fmt)
 
 
 def save_profile(profile, force=False):
-    profile=add_temp_units(profile)
+    '''raises ProfileError if the profile is not valid'''
+    profile = validate_profile(profile)
     profile_json = json.dumps(profile)
     filename = profile['name']+".json"
     filepath = os.path.join(profile_path, filename)
@@ -282,63 +457,25 @@ def save_profile(profile, force=False):
     with open(filepath, 'w+') as f:
         f.write(profile_json)
         f.close()
+    profile_store.invalidate(filename)
     log.info("Wrote %s" % filepath)
     return True
 
-def add_temp_units(profile):
-    """
-    always store the temperature in degrees c
-    this way folks can share profiles
-    """
-    if "temp_units" in profile:
-        return profile
-    profile['temp_units']="c"
-    if config.temp_scale=="c":
-        return profile
-    if config.temp_scale=="f":
-        profile=convert_to_c(profile);
-        return profile
-
-def convert_to_c(profile):
-    newdata=[]
-    for (secs,temp) in profile["data"]:
-        temp = (5/9)*(temp-32)
-        newdata.append((secs,temp))
-    profile["data"]=newdata
-    return profile
-
-def convert_to_f(profile):
-    newdata=[]
-    for (secs,temp) in profile["data"]:
-        temp = ((9/5)*temp)+32
-        newdata.append((secs,temp))
-    profile["data"]=newdata
-    return profile
-
-def normalize_temp_units(profiles):
-    normalized = []
-    for profile in profiles:
-        if "temp_units" in profile:
-            if config.temp_scale == "f" and profile["temp_units"] == "c": 
-                profile = convert_to_f(profile)
-                profile["temp_units"] = "f"
-        normalized.append(profile)
-    return normalized
-
 def delete_profile(profile):
     profile_json = json.dumps(profile)
     filename = profile['name']+".json"
     filepath = os.path.join(profile_path, filename)
     os.remove(filepath)
+    profile_store.invalidate(filename)
     log.info("Deleted %s" % filepath)
     return True
 
-def get_config():
-    return json.dumps({"temp_scale": config.temp_scale,
-        "time_scale_slope": config.time_scale_slope,
-        "time_scale_profile": config.time_scale_profile,
-        "kwh_rate": config.kwh_rate,
-        "currency_type": config.currency_type})    
+def get_config(kiln_config=config):
+    return json.dumps({"temp_scale": kiln_config.temp_scale,
+        "time_scale_slope": kiln_config.time_scale_slope,
+        "time_scale_profile": kiln_config.time_scale_profile,
+        "kwh_rate": kiln_config.kwh_rate,
+        "currency_type": kiln_config.currency_type})    
 
 def main():
     ip = "0.0.0.0"
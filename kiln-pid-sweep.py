@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import multiprocessing
+
+try:
+        sys.dont_write_bytecode = True
+        import config
+        sys.dont_write_bytecode = False
+
+except ImportError:
+        print("Could not import config file.")
+        print("Copy config.py.EXAMPLE to config.py and adapt it for your setup.")
+        exit(1)
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, script_dir + '/lib/')
+
+# each worker process builds one headless oven and reuses it for
+# every set of gains it is handed
+worker_oven = None
+worker_profile = None
+
+
+def load_profile(name):
+    '''name can be a path to a profile json file or the name of a
+    profile in config.kiln_profiles_directory'''
+    from oven import Profile
+    from profileStore import normalize_temp_units
+
+    path = name
+    if not os.path.isfile(path):
+        path = os.path.join(config.kiln_profiles_directory, name + ".json")
+    with open(path) as infile:
+        profile = json.load(infile)
+
+    # profiles are stored in c, the simulator runs in config.temp_scale.
+    # this converts the compiled copy too, the same as ProfileStore
+    profile = normalize_temp_units([profile])[0]
+    return Profile(profile)
+
+
+def parse_gains(text):
+    '''"1,2,5" is a list of values, "10:50:5" is start:stop:step
+    with stop included'''
+    if ":" in text:
+        start, stop, step = [float(x) for x in text.split(":")]
+        values = []
+        value = start
+        while value <= stop + 1e-9:
+            values.append(round(value, 6))
+            value += step
+        return values
+    return [float(x) for x in text.split(",")]
+
+
+def score(trace, window, duration):
+    '''tracking error, overshoot and time outside the pid control window
+    for one simulated run'''
+    # the last tick lands past the end of the schedule where target is 0
+    trace = [s for s in trace if s['runtime'] <= duration]
+    if not trace:
+        return None
+    total_error = 0
+    overshoot = 0
+    outside = 0
+    for sample in trace:
+        error = sample['temperature'] - sample['target']
+        total_error += abs(error)
+        if error > overshoot:
+            overshoot = error
+        if abs(error) > window:
+            outside += 1
+    return {
+        'error': total_error / len(trace),
+        'overshoot': overshoot,
+        'outside': outside * config.sensor_time_wait,
+        'runtime': trace[-1]['runtime'],
+    }
+
+
+def init_worker(profile_name):
+    global worker_oven, worker_profile
+    from oven import SimulatedOven
+    worker_oven = SimulatedOven(headless=True)
+    worker_profile = load_profile(profile_name)
+
+
+def run_gains(gains):
+    kp, ki, kd = gains
+    trace = worker_oven.simulate(worker_profile, kp=kp, ki=ki, kd=kd)
+    result = score(trace, config.pid_control_window, worker_profile.get_duration())
+    if result:
+        result.update({'kp': kp, 'ki': ki, 'kd': kd})
+    return result
+
+
+def sweep(profile_name, kps, kis, kds, processes=None):
+    gains = list(itertools.product(kps, kis, kds))
+    with multiprocessing.Pool(processes, init_worker, (profile_name,)) as pool:
+        results = pool.map(run_gains, gains, chunksize=max(1, len(gains) // (4 * (processes or os.cpu_count() or 1))))
+    return [r for r in results if r]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Sweep PID gains against a profile using the simulated oven')
+    parser.add_argument('-p', '--profile', type=str, default="cone-6-long-glaze", help="profile name in the profiles directory or path to a profile json file")
+    parser.add_argument('--kp', type=str, default="5:25:5", help="values for pid_kp, either a,b,c or start:stop:step")
+    parser.add_argument('--ki', type=str, default="40:160:40", help="values for pid_ki, either a,b,c or start:stop:step")
+    parser.add_argument('--kd', type=str, default="100:400:100", help="values for pid_kd, either a,b,c or start:stop:step")
+    parser.add_argument('-s', '--sort', type=str, default="error", choices=['error', 'overshoot', 'outside'], help="rank by average tracking error, max overshoot or seconds outside pid_control_window")
+    parser.add_argument('-n', '--top', type=int, default=10, help="how many results to show")
+    parser.add_argument('-j', '--processes', type=int, default=None, help="worker processes (default is one per cpu)")
+    args = parser.parse_args()
+
+    kps = parse_gains(args.kp)
+    kis = parse_gains(args.ki)
+    kds = parse_gains(args.kd)
+    print("simulating %d gain combinations of %s" % (len(kps) * len(kis) * len(kds), args.profile))
+
+    started = time.time()
+    results = sweep(args.profile, kps, kis, kds, args.processes)
+    results.sort(key=lambda r: (r[args.sort], r['error'], r['overshoot'], r['outside']))
+
+    print("done in %.1f seconds" % (time.time() - started))
+    print("%10s %10s %10s %10s %10s %10s" % ("kp", "ki", "kd", "error", "overshoot", "outside"))
+    for r in results[:args.top]:
+        print("%10g %10g %10g %10.2f %10.2f %10d" % (r['kp'], r['ki'], r['kd'], r['error'], r['overshoot'], r['outside']))
+
+    if results:
+        best = results[0]
+        print("")
+        print("pid_kp = %s" % (best['kp']))
+        print("pid_ki = %s" % (best['ki']))
+        print("pid_kd = %s" % (best['kd']))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import argparse
+
+try:
+        sys.dont_write_bytecode = True
+        import config
+        sys.dont_write_bytecode = False
+
+except ImportError:
+        print("Could not import config file.")
+        print("Copy config.py.EXAMPLE to config.py and adapt it for your setup.")
+        exit(1)
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, script_dir + '/lib/')
+
+
+def load_profile(name):
+    '''name can be a path to a profile json file or the name of a
+    profile in config.kiln_profiles_directory'''
+    from oven import Profile
+    from profileStore import ProfileStore, normalize_temp_units
+
+    if os.path.isfile(name):
+        with open(name) as infile:
+            profile = json.load(infile)
+        # stored profiles are in c, convert them and their compiled copy
+        # to config.temp_scale the same as ProfileStore does
+        return Profile(normalize_temp_units([profile])[0])
+    profile = ProfileStore(config.kiln_profiles_directory).get_profile(name)
+    if profile is None:
+        print("no profile named %s" % name)
+        exit(1)
+    return profile
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run a recorded firing through the oven control and safety code, without hardware and as fast as possible')
+    parser.add_argument('trace', type=str, help="a kiln-logger.py csv, a kiln-tuner.py tuning.csv or a daemon.log")
+    parser.add_argument('-p', '--profile', type=str, required=True, help="profile name in the profiles directory or path to a profile json file")
+    parser.add_argument('-l', '--log', type=str, default=None, help="daemon.log to take the thermocouple faults from for a csv trace")
+    parser.add_argument('-r', '--repeat', type=int, default=1, help="replay this many times, to time the control loop")
+    args = parser.parse_args()
+
+    from oven import ReplayOven
+    from kilnTrace import load_trace
+
+    trace = load_trace(args.trace, args.log)
+    profile = load_profile(args.profile)
+    oven = ReplayOven(trace)
+
+    started = time.time()
+    for i in range(args.repeat):
+        samples = oven.simulate(profile)
+    elapsed = time.time() - started
+
+    print("trace: %d temperatures over %.1f hours, %d thermocouple faults" % (len(trace),
+        trace.duration() / 3600, trace.fault_count()))
+    print("replay: %d ticks, %.1f hours of kiln time" % (len(samples), len(samples) * oven.time_step / 3600))
+    print("outcome: %s" % (oven.outcome))
+    if oven.outcome == "emergency":
+        # the last tick is recorded after the oven was reset
+        samples = samples[:-1]
+    if samples:
+        last = samples[-1]
+        print("ended at runtime %d s, temperature %.1f, target %.1f" % (last['runtime'],
+            last['temperature'], last['target']))
+        errors = [abs(s['temperature'] - s['target']) for s in samples]
+        print("average error %.1f, worst %.1f, %d ticks catching up" % (sum(errors) / len(errors),
+            max(errors), sum(1 for s in samples if s['catching_up'])))
+    print("thermocouple: %s" % json.dumps(oven.board.temp_sensor.status.get_metrics()['faults']))
+    print("done in %.2f seconds, %.0f ticks per second" % (elapsed,
+        len(samples) * args.repeat / elapsed if elapsed else 0))
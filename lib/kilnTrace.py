@@ -0,0 +1,132 @@
+import re
+import csv
+import bisect
+import logging
+import datetime
+
+log = logging.getLogger(__name__)
+
+# kiln-controller.py logs with config.log_format, which starts with asctime.
+# in /var/log/daemon.log there is a syslog prefix in front of that
+LOG_LINE = re.compile(r'(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3}) \S+ \S+: (.*)$')
+LOG_TEMP = re.compile(r'^temp=(-?[\d.]+),')
+LOG_FAULT = re.compile(r'^Problem reading temp (\(ignored\) )?(.*)$')
+
+class KilnTrace(object):
+    '''The temperatures of a past firing, as seen by the oven (so with
+    config.thermocouple_offset), with the thermocouple faults that were
+    logged before each one. times are unix times. faults are lists of
+    (fault, ignored).
+    '''
+    def __init__(self):
+        self.times = []
+        self.temperatures = []
+        self.faults = []
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, t, temperature, faults=None):
+        self.times.append(t)
+        self.temperatures.append(temperature)
+        self.faults.append(faults or [])
+
+    def duration(self):
+        if not self.times:
+            return 0
+        return self.times[-1] - self.times[0]
+
+    def fault_count(self):
+        return sum(len(faults) for faults in self.faults)
+
+    def add_faults(self, faults):
+        '''faults is a list of (time, fault, ignored). each one goes with
+        the first temperature at or after it, as the oven would have seen
+        it. faults after the last temperature are dropped.'''
+        for t, fault, ignored in faults:
+            i = bisect.bisect_left(self.times, t)
+            if i < len(self.times):
+                self.faults[i].append((fault, ignored))
+
+
+def log_time(stamp):
+    return datetime.datetime.strptime(stamp, "%Y-%m-%d %H:%M:%S,%f").timestamp()
+
+def read_log(path):
+    '''(trace, faults) from a kiln-controller daemon.log. there is a
+    temperature each time_step while a profile is running. faults are
+    logged at any time, the ones before the first temperature are
+    returned as (time, fault, ignored).'''
+    trace = KilnTrace()
+    pending = []
+    early = []
+    with open(path, errors="replace") as infile:
+        for line in infile:
+            match = LOG_LINE.search(line.rstrip("\n"))
+            if not match:
+                continue
+            stamp, message = match.groups()
+            temp = LOG_TEMP.match(message)
+            if temp:
+                trace.append(log_time(stamp), float(temp.group(1)), pending)
+                pending = []
+                continue
+            fault = LOG_FAULT.match(message)
+            if fault:
+                if len(trace):
+                    pending.append((fault.group(2), bool(fault.group(1))))
+                else:
+                    early.append((log_time(stamp), fault.group(2), bool(fault.group(1))))
+    return trace, early
+
+def read_log_faults(path):
+    '''every fault in a daemon.log as (time, fault, ignored)'''
+    faults = []
+    with open(path, errors="replace") as infile:
+        for line in infile:
+            match = LOG_LINE.search(line.rstrip("\n"))
+            if not match:
+                continue
+            fault = LOG_FAULT.match(match.group(2))
+            if fault:
+                faults.append((log_time(match.group(1)), fault.group(2), bool(fault.group(1))))
+    return faults
+
+def read_csv(path):
+    '''a kiln-logger.py csv (stamp, temperature...) or a kiln-tuner.py
+    tuning.csv (time, temperature). neither has the faults.'''
+    trace = KilnTrace()
+    with open(path, newline="") as infile:
+        reader = csv.DictReader(infile)
+        columns = reader.fieldnames or []
+        time_column = None
+        for name in ("stamp", "time", "runtime"):
+            if name in columns:
+                time_column = name
+                break
+        if time_column is None or "temperature" not in columns:
+            raise ValueError("%s has no time and temperature columns" % path)
+        for row in reader:
+            try:
+                trace.append(float(row[time_column]), float(row["temperature"]))
+            except (TypeError, ValueError):
+                continue
+    return trace
+
+def load_trace(path, log_path=None):
+    '''a KilnTrace from a kiln-logger.py csv, a kiln-tuner.py tuning.csv
+    or a daemon.log. log_path is a daemon.log to take the faults from
+    for a csv trace.'''
+    with open(path, errors="replace") as infile:
+        first = infile.readline()
+    if "temperature" in [column.strip() for column in first.split(",")]:
+        trace = read_csv(path)
+        faults = read_log_faults(log_path) if log_path else []
+    else:
+        trace, faults = read_log(path)
+    trace.add_faults(faults)
+    if not len(trace):
+        raise ValueError("no temperatures found in %s" % path)
+    log.info("trace %s: %d temperatures over %d seconds, %d faults" % (path,
+        len(trace), trace.duration(), trace.fault_count()))
+    return trace
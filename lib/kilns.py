@@ -0,0 +1,90 @@
+import os
+import logging
+import config
+from oven import SimulatedOven, RealOven
+from ovenWatcher import OvenWatcher
+
+log = logging.getLogger(__name__)
+
+# all kilns share one ProfileStore, which converts profiles with the
+# temp_scale in config.py, so these can not be set for one kiln
+SHARED_SETTINGS = ("temp_scale", "kiln_profiles_directory")
+
+class KilnConfig(object):
+    '''config.py as seen by one kiln. any setting in this kiln's entry in
+    config.kilns replaces the one in config.py, everything else comes
+    from config.py.
+    '''
+    def __init__(self, kiln_id, settings):
+        self.kiln_id = kiln_id
+        self.settings = settings
+
+    def __getattr__(self, name):
+        settings = self.__dict__.get("settings", {})
+        if name in settings:
+            return settings[name]
+        return getattr(config, name)
+
+
+class Kiln(object):
+    '''one oven and the watcher that records it and sends its state
+    to websocket clients'''
+    def __init__(self, kiln_id, kiln_config, profile_store, run_archive=None):
+        self.id = kiln_id
+        self.config = kiln_config
+        if self.config.simulate == True:
+            log.info("kiln %s is a simulation" % kiln_id)
+            self.oven = SimulatedOven(kiln_config=self.config)
+        else:
+            log.info("kiln %s is a real kiln" % kiln_id)
+            self.oven = RealOven(kiln_config=self.config)
+        self.watcher = OvenWatcher(self.oven)
+        self.watcher.set_run_archive(run_archive)
+        # this ovenwatcher is used in the oven class for restarts
+        self.oven.set_ovenwatcher(self.watcher)
+        self.oven.set_profile_store(profile_store)
+
+    def summary(self):
+        state = self.oven.get_state()
+        return {
+            'id': self.id,
+            'state': state['state'],
+            'temperature': state['temperature'],
+            'target': state['target'],
+            'profile': state['profile'],
+            'runtime': state['runtime'],
+            'totaltime': state['totaltime'],
+        }
+
+
+def kiln_configs():
+    '''(kiln_id, KilnConfig) for every kiln in config.kilns, or a single
+    kiln named "default" using config.py as is if there are none.
+    '''
+    kilns = getattr(config, "kilns", None)
+    if not kilns:
+        return [("default", KilnConfig("default", {}))]
+
+    configs = []
+    for kiln_id, settings in kilns.items():
+        settings = dict(settings)
+        for name in SHARED_SETTINGS:
+            if name in settings:
+                raise ValueError("kiln %s: %s is the same for all kilns, set it in config.py and not in config.kilns" % (kiln_id, name))
+        # kilns must not share a state file or they restart each other
+        if "automatic_restart_state_file" not in settings:
+            settings["automatic_restart_state_file"] = os.path.join(
+                os.path.dirname(config.automatic_restart_state_file),
+                "state-%s.json" % kiln_id)
+        configs.append((kiln_id, KilnConfig(kiln_id, settings)))
+    return configs
+
+
+def build_kilns(profile_store, run_archive=None):
+    '''create and start every kiln. returns a dict of kiln_id -> Kiln in
+    the order they are listed in config.kilns. all kilns share the
+    profile_store and the run_archive.'''
+    kilns = {}
+    for kiln_id, kiln_config in kiln_configs():
+        kilns[kiln_id] = Kiln(kiln_id, kiln_config, profile_store, run_archive)
+    return kilns
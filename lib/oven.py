@@ -8,7 +8,8 @@ import os
 import digitalio
 import busio
 import adafruit_bitbangio as bitbangio
-import statistics
+import bisect
+import collections
 
 log = logging.getLogger(__name__)
 
@@ -37,9 +38,10 @@ class Output(object):
     inputs
         config.gpio_heat
     '''
-    def __init__(self):
+    def __init__(self, kiln_config=None):
+        self.config = kiln_config or config
         self.active = False
-        self.heater = digitalio.DigitalInOut(config.gpio_heat) 
+        self.heater = digitalio.DigitalInOut(self.config.gpio_heat) 
         self.heater.direction = digitalio.Direction.OUTPUT 
 
     def heat(self,sleepfor):
@@ -65,7 +67,8 @@ class RealBoard(Board):
     Any blinka board that supports SPI can be used. The
     board is automatically detected by blinka.
     '''
-    def __init__(self):
+    def __init__(self, kiln_config=None):
+        self.config = kiln_config or config
         self.name = None
         self.load_libs()
         self.temp_sensor = self.choose_tempsensor()
@@ -76,142 +79,557 @@ class RealBoard(Board):
         self.name = board.board_id
 
     def choose_tempsensor(self):
-        if config.max31855:
-            return Max31855()
-        if config.max31856:
-            return Max31856()
+        '''one thermocouple on config.spi_cs, or a group of them if
+        config.thermocouples lists more'''
+        thermocouples = getattr(self.config, "thermocouples", None)
+        if thermocouples:
+            sensors = {}
+            for name, spi_cs in thermocouples.items():
+                sensors[name] = self.make_tempsensor(spi_cs)
+            return TempSensorGroup(sensors, self.config)
+        return self.make_tempsensor()
+
+    def make_tempsensor(self, spi_cs=None):
+        if self.config.max31855:
+            return Max31855(self.config, spi_cs)
+        if self.config.max31856:
+            return Max31856(self.config, spi_cs)
 
 class SimulatedBoard(Board):
     '''Simulated board used during simulations.
     See config.simulate
     '''
-    def __init__(self):
+    def __init__(self, kiln_config=None):
+        self.config = kiln_config or config
         self.name = "simulated"
-        self.temp_sensor = TempSensorSimulated()
+        self.temp_sensor = TempSensorSimulated(self.config)
         Board.__init__(self) 
 
+class ReplayBoard(Board):
+    '''Board with a recorded firing in place of the thermocouple.
+    See ReplayOven
+    '''
+    def __init__(self, temp_sensor, kiln_config=None):
+        self.config = kiln_config or config
+        self.name = "replay"
+        self.temp_sensor = temp_sensor
+        Board.__init__(self)
+
 class TempSensor(threading.Thread):
     '''Used by the Board class. Each Board must have
     a TempSensor.
     '''
-    def __init__(self):
+    def __init__(self, kiln_config=None):
         threading.Thread.__init__(self)
         self.daemon = True
-        self.time_step = config.sensor_time_wait
-        self.status = ThermocoupleTracker()
+        self.config = kiln_config or config
+        self.time_step = self.config.sensor_time_wait
+        self.status = ThermocoupleTracker(kiln_config=self.config)
+
+    def get_metrics(self):
+        '''how the sensor is being read, for /api/sensor'''
+        return {'thermocouple': self.status.get_metrics()}
+
+    def temperatures(self):
+        '''{name: temperature} for each thermocouple if there is more
+        than one'''
+        return {}
 
 class TempSensorSimulated(TempSensor):
     '''Simulates a temperature sensor '''
-    def __init__(self):
-        TempSensor.__init__(self)
-        self.simulated_temperature = config.sim_t_env
+    def __init__(self, kiln_config=None):
+        TempSensor.__init__(self, kiln_config)
+        self.simulated_temperature = self.config.sim_t_env
     def temperature(self):
         return self.simulated_temperature
 
+class TempSensorReplay(TempSensor):
+    '''Plays back a KilnTrace (see lib/kilnTrace.py) instead of reading
+    a thermocouple. clock() is the seconds since the start of the trace,
+    so the trace goes by as fast as whoever owns the clock wants. The
+    faults in the trace go into the ThermocoupleTracker as they are
+    passed, topped up with good reads to temperature_average_samples per
+    temperature like TempSensorReal would have counted them.
+    '''
+    def __init__(self, trace, clock, kiln_config=None):
+        TempSensor.__init__(self, kiln_config)
+        self.trace = trace
+        self.clock = clock
+        self.reads = self.config.temperature_average_samples
+        self.rewind()
+
+    def rewind(self):
+        self.status = ThermocoupleTracker(kiln_config=self.config)
+        self.position = -1
+        self.first = self.trace.times[0]
+
+    def advance(self):
+        end = bisect.bisect_right(self.trace.times, self.first + self.clock()) - 1
+        while self.position < end:
+            self.position += 1
+            faults = self.trace.faults[self.position]
+            for fault, ignored in faults:
+                if ignored:
+                    self.status.ignored(fault)
+                else:
+                    self.status.bad(fault)
+            for i in range(self.reads - len(faults)):
+                self.status.good()
+
+    def temperature(self):
+        '''the trace has the temperature the oven saw, with the offset'''
+        self.advance()
+        return self.trace.temperatures[max(0, self.position)] - self.config.thermocouple_offset
+
+    def finished(self):
+        return self.first + self.clock() >= self.trace.times[-1]
+
 class TempSensorReal(TempSensor):
     '''real temperature sensor that takes many measurements
        during the time_step
        inputs
            config.temperature_average_samples 
     '''
-    def __init__(self):
-        TempSensor.__init__(self)
-        self.sleeptime = self.time_step / float(config.temperature_average_samples)
-        self.temptracker = TempTracker() 
+    def __init__(self, kiln_config=None, spi_cs=None):
+        TempSensor.__init__(self, kiln_config)
+        self.sleeptime = self.time_step / float(self.config.temperature_average_samples)
+        self.temptracker = TempTracker(kiln_config=self.config)
+        self.sampler = SampleClock(self.sleeptime)
         self.spi_setup()
-        self.cs = digitalio.DigitalInOut(config.spi_cs)
+        self.cs = digitalio.DigitalInOut(spi_cs or self.config.spi_cs)
+
+    # every thermocouple on the same SPI bus shares one SPI object and a
+    # lock for it. each one has its own chip select (config.spi_cs).
+    spi_buses = {}
+    spi_buses_lock = threading.Lock()
 
     def spi_setup(self):
-        if(hasattr(config,'spi_sclk') and
-           hasattr(config,'spi_mosi') and
-           hasattr(config,'spi_miso')):
-            self.spi = bitbangio.SPI(config.spi_sclk, config.spi_mosi, config.spi_miso)
-            log.info("Software SPI selected for reading thermocouple")
+        software = (hasattr(self.config,'spi_sclk') and
+           hasattr(self.config,'spi_mosi') and
+           hasattr(self.config,'spi_miso'))
+        if software:
+            bus = tuple(str(pin) for pin in (self.config.spi_sclk, self.config.spi_mosi, self.config.spi_miso))
         else:
-            import board
-            self.spi = board.SPI();
-            log.info("Hardware SPI selected for reading thermocouple")
+            bus = "hardware"
+
+        with TempSensorReal.spi_buses_lock:
+            if bus not in TempSensorReal.spi_buses:
+                if software:
+                    spi = bitbangio.SPI(self.config.spi_sclk, self.config.spi_mosi, self.config.spi_miso)
+                    log.info("Software SPI selected for reading thermocouple")
+                else:
+                    import board
+                    spi = board.SPI();
+                    log.info("Hardware SPI selected for reading thermocouple")
+                TempSensorReal.spi_buses[bus] = (spi, threading.Lock())
+            (self.spi, self.spi_lock) = TempSensorReal.spi_buses[bus]
 
     def get_temperature(self):
         '''read temp from tc and convert if needed'''
         try:
-            temp = self.raw_temp() # raw_temp provided by subclasses
-            if config.temp_scale.lower() == "f":
+            with self.spi_lock:
+                temp = self.raw_temp() # raw_temp provided by subclasses
+            if self.config.temp_scale.lower() == "f":
                 temp = (temp*9/5)+32
             self.status.good()
             return temp
         except ThermocoupleError as tce:
             if tce.ignore:
                 log.error("Problem reading temp (ignored) %s" % (tce.message))
-                self.status.good()
+                self.status.ignored(tce.message)
             else:
                 log.error("Problem reading temp %s" % (tce.message))
-                self.status.bad()
+                self.status.bad(tce.message)
         return None
 
     def temperature(self):
         '''average temp over a duty cycle'''
         return self.temptracker.get_avg_temp()
 
+    def get_metrics(self):
+        metrics = TempSensor.get_metrics(self)
+        metrics.update(self.sampler.get_metrics())
+        return metrics
+
+    def read(self):
+        '''take one reading into the window'''
+        temp = self.get_temperature()
+        if temp:
+            self.temptracker.add(temp)
+
+    def run(self):
+        while True:
+            started = self.sampler.start_read()
+            self.read()
+            self.sampler.end_read(started)
+            self.sampler.wait()
+
+class TempSensorGroup(TempSensor):
+    '''Several thermocouples in one kiln, say top and bottom, each on its
+    own chip select on the same SPI bus. One thread reads all of them
+    back to back on each tick, so every thermocouple gets the same number
+    of readings per time_step and the control loop never waits on them.
+    The kiln temperature is the median, mean or max of the thermocouples.
+    inputs
+        config.thermocouples
+        config.thermocouple_fusion
+    '''
+    def __init__(self, sensors, kiln_config=None):
+        TempSensor.__init__(self, kiln_config)
+        self.sensors = sensors
+        self.fusion = getattr(self.config, "thermocouple_fusion", "max")
+        if self.fusion not in ("median", "mean", "max"):
+            raise ValueError("thermocouple_fusion must be median, mean or max, not %s" % self.fusion)
+        self.sleeptime = self.time_step / float(self.config.temperature_average_samples)
+        self.sampler = SampleClock(self.sleeptime)
+        self.status = ThermocoupleGroupTracker([s.status for s in sensors.values()])
+        log.info("%d thermocouples, kiln temperature is the %s of %s" % (len(sensors),
+            self.fusion, ", ".join(sensors)))
+
+    def temperatures(self):
+        return {name: sensor.temperature() for name, sensor in self.sensors.items()}
+
+    def temperature(self):
+        temps = sorted(self.temperatures().values())
+        if self.fusion == "max":
+            return temps[-1]
+        if self.fusion == "mean":
+            return sum(temps) / len(temps)
+        middle = len(temps) // 2
+        if len(temps) % 2:
+            return temps[middle]
+        return (temps[middle - 1] + temps[middle]) / 2
+
+    def get_metrics(self):
+        metrics = self.sampler.get_metrics()
+        metrics['fusion'] = self.fusion
+        metrics['thermocouple'] = self.status.get_metrics()
+        metrics['sensors'] = {}
+        for name, sensor in self.sensors.items():
+            metrics['sensors'][name] = {
+                'temperature': sensor.temperature(),
+                'thermocouple': sensor.status.get_metrics(),
+            }
+        return metrics
+
     def run(self):
         while True:
-            temp = self.get_temperature()
-            if temp:
-                self.temptracker.add(temp)
-            time.sleep(self.sleeptime)
+            started = self.sampler.start_read()
+            for sensor in self.sensors.values():
+                sensor.read()
+            self.sampler.end_read(started)
+            self.sampler.wait()
+
+class SampleClock(object):
+    '''Paces sensor reads to one every period seconds on the monotonic
+    clock. Each read is due one period after the one before it was due,
+    not one period after it finished, so slow reads do not stretch the
+    period. If reads fall so far behind that a deadline has already
+    passed, it is counted as missed and skipped instead of reading
+    several times in a row to catch up.
+    '''
+    # weight of the newest sample in the running averages
+    smoothing = 0.05
+
+    def __init__(self, period):
+        self.period = period
+        self.next_read = None
+        self.last_start = None
+        self.samples = 0
+        self.missed = 0
+        self.interval = 0
+        self.interval_avg = period
+        self.jitter = 0
+        self.read_latency = 0
+        self.read_latency_avg = 0
+        self.read_latency_max = 0
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def start_read(self):
+        started = self.now()
+        if self.next_read is None:
+            self.next_read = started
+        if self.last_start is not None:
+            self.interval = started - self.last_start
+            self.interval_avg += self.smoothing * (self.interval - self.interval_avg)
+            self.jitter += self.smoothing * (abs(self.interval - self.period) - self.jitter)
+        self.last_start = started
+        return started
+
+    def end_read(self, started):
+        self.read_latency = self.now() - started
+        if self.samples == 0:
+            self.read_latency_avg = self.read_latency
+        self.read_latency_avg += self.smoothing * (self.read_latency - self.read_latency_avg)
+        self.read_latency_max = max(self.read_latency_max, self.read_latency)
+        self.samples += 1
+
+    def wait(self):
+        '''sleep until the next read is due'''
+        self.next_read += self.period
+        now = self.now()
+        if now > self.next_read:
+            missed = int((now - self.next_read) / self.period) + 1
+            self.missed += missed
+            self.next_read += missed * self.period
+            log.debug("sensor read missed %d deadlines" % missed)
+        self.sleep(self.next_read - now)
+
+    def get_metrics(self):
+        return {
+            'period': self.period,
+            'samples': self.samples,
+            'missed': self.missed,
+            'interval': self.interval,
+            'interval_avg': self.interval_avg,
+            'jitter': self.jitter,
+            'read_latency': self.read_latency,
+            'read_latency_avg': self.read_latency_avg,
+            'read_latency_max': self.read_latency_max,
+        }
 
 class TempTracker(object):
     '''creates a sliding window of N temperatures per
-       config.sensor_time_wait
+       config.sensor_time_wait. the window is a ring buffer, and a
+       sorted copy of it is kept up to date as temperatures come and
+       go, so the median is ready without sorting on every call. each
+       temperature is kept with the time it was read.
     '''
-    def __init__(self):
-        self.size = config.temperature_average_samples
+    def __init__(self, size=None, kiln_config=None):
+        self.size = size or (kiln_config or config).temperature_average_samples
+        self.lock = threading.Lock()
         self.temps = [0 for i in range(self.size)]
-  
-    def add(self,temp):
-        self.temps.append(temp)
-        while(len(self.temps) > self.size):
-            del self.temps[0]
+        self.times = [0 for i in range(self.size)]
+        self.sorted = sorted(self.temps)
+        # where the next temperature goes, which is also the oldest one
+        self.next = 0
+        self.median = self.find_median()
+
+    def add(self, temp, now=None):
+        with self.lock:
+            oldest = self.temps[self.next]
+            del self.sorted[bisect.bisect_left(self.sorted, oldest)]
+            bisect.insort(self.sorted, temp)
+            self.temps[self.next] = temp
+            self.times[self.next] = time.time() if now is None else now
+            self.next = (self.next + 1) % self.size
+            self.median = self.find_median()
+
+    def find_median(self):
+        middle = self.size // 2
+        if self.size % 2:
+            return self.sorted[middle]
+        return (self.sorted[middle - 1] + self.sorted[middle]) / 2
 
     def get_avg_temp(self, chop=25):
         '''
         take the median of the given values. this used to take an avg
         after getting rid of outliers. median works better.
         '''
-        return statistics.median(self.temps)
+        return self.median
+
+    def samples(self):
+        '''(time, temp) for the whole window, oldest first'''
+        with self.lock:
+            order = list(range(self.next, self.size)) + list(range(self.next))
+            return [(self.times[i], self.temps[i]) for i in order]
+
+class SlopeWindow(object):
+    '''least squares slope of the samples from the last horizon seconds.
+    the sums for the fit are kept as samples come and go, so add() and
+    slope() do not depend on how many samples there are. the sums are
+    rebuilt once per capacity samples so rounding errors can not pile up.
+    '''
+    def __init__(self, horizon, capacity):
+        self.horizon = horizon
+        self.samples = collections.deque()
+        self.capacity = max(2, capacity)
+        self.clear()
+
+    def clear(self):
+        self.samples.clear()
+        self.origin = None
+        self.st = self.sy = self.stt = self.sty = 0.0
+        self.updates = 0
+
+    def include(self, t, y, sign):
+        t -= self.origin
+        self.st += sign * t
+        self.sy += sign * y
+        self.stt += sign * t * t
+        self.sty += sign * t * y
+
+    def add(self, t, y):
+        if self.samples and t <= self.samples[-1][0]:
+            return
+        if self.origin is None:
+            self.origin = t
+        while self.samples and (len(self.samples) >= self.capacity or
+                                self.samples[0][0] < t - self.horizon):
+            old_t, old_y = self.samples.popleft()
+            self.include(old_t, old_y, -1)
+        self.samples.append((t, y))
+        self.include(t, y, 1)
+        self.updates += 1
+        if self.updates >= self.capacity:
+            self.rebuild()
+
+    def rebuild(self):
+        samples = list(self.samples)
+        self.clear()
+        self.origin = samples[0][0]
+        self.samples.extend(samples)
+        for t, y in samples:
+            self.include(t, y, 1)
+
+    def slope(self):
+        '''change in y per second, 0 until there are two samples'''
+        n = len(self.samples)
+        if n < 2 or self.samples[-1][0] <= self.samples[0][0]:
+            return 0
+        den = n * self.stt - self.st * self.st
+        if den <= 0:
+            return 0
+        return (n * self.sty - self.st * self.sy) / den
+
+
+class HeatRateTracker(object):
+    '''heating rate in degrees/hour over several horizons in seconds.
+    add() is called once per sensor tick with a time in seconds.
+    '''
+    def __init__(self, horizons, time_step):
+        # room for twice the samples expected in a horizon, in case
+        # ticks come faster than time_step
+        self.windows = [SlopeWindow(h, int(2 * h / time_step) + 2) for h in horizons]
+
+    def clear(self):
+        for window in self.windows:
+            window.clear()
+
+    def add(self, t, temp):
+        for window in self.windows:
+            window.add(t, temp)
+
+    def rates(self):
+        '''{horizon: degrees/hour}'''
+        return {w.horizon: w.slope() * 3600 for w in self.windows}
+
 
 class ThermocoupleTracker(object):
     '''Keeps sliding window to track successful/failed calls to get temp
-       over the last two duty cycles.
+       over the last two duty cycles. The window is a ring buffer with a
+       running count of errors, so checking the error limit does not
+       look at the whole window.
+
+       Every fault is also counted by type (not connected, short
+       circuit...) for the window and since start up, including faults
+       that are ignored in config.py, so a thermocouple that is slowly
+       going bad shows up long before it trips the error limit.
     '''
-    def __init__(self):
-        self.size = config.temperature_average_samples * 2 
-        self.status = [True for i in range(self.size)]
+    def __init__(self, size=None, kiln_config=None):
+        self.size = size or (kiln_config or config).temperature_average_samples * 2
+        # None is a good read, otherwise the fault
+        self.status = [None for i in range(self.size)]
+        self.next = 0
+        self.errors = 0
         self.limit = 30
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.reads = 0
+        # fault -> count
+        self.window_faults = collections.Counter()
+        self.lifetime_faults = collections.Counter()
+        self.ignored_faults = collections.Counter()
+
+    def record(self, fault):
+        with self.lock:
+            oldest = self.status[self.next]
+            if oldest is not None:
+                self.errors -= 1
+                self.window_faults[oldest] -= 1
+                if not self.window_faults[oldest]:
+                    del self.window_faults[oldest]
+            if fault is not None:
+                self.errors += 1
+                self.window_faults[fault] += 1
+                self.lifetime_faults[fault] += 1
+            self.status[self.next] = fault
+            self.next = (self.next + 1) % self.size
+            self.reads += 1
 
     def good(self):
         '''True is good!'''
-        self.status.append(True)
-        del self.status[0]
+        self.record(None)
 
-    def bad(self):
+    def bad(self, fault="unknown"):
         '''False is bad!'''
-        self.status.append(False)
-        del self.status[0]
+        self.record(fault)
+
+    def ignored(self, fault="unknown"):
+        '''a fault that config.py says to ignore. it counts as a good
+        read for the error limit'''
+        with self.lock:
+            self.ignored_faults[fault] += 1
+        self.good()
 
     def error_percent(self):
-        errors = sum(i == False for i in self.status) 
-        return (errors/self.size)*100
+        return (self.errors/self.size)*100
 
     def over_error_limit(self):
         if self.error_percent() > self.limit:
             return True
         return False
 
+    def get_metrics(self):
+        '''fault counts for /api/sensor. rates are percents of reads.'''
+        with self.lock:
+            faults = {}
+            for fault in set(self.lifetime_faults) | set(self.ignored_faults):
+                lifetime = self.lifetime_faults[fault] + self.ignored_faults[fault]
+                faults[fault] = {
+                    'window': self.window_faults[fault],
+                    'window_rate': self.window_faults[fault] / self.size * 100,
+                    'lifetime': lifetime,
+                    'lifetime_rate': lifetime / self.reads * 100 if self.reads else 0,
+                    'ignored': self.ignored_faults[fault],
+                }
+            return {
+                'window': self.size,
+                'error_percent': self.error_percent(),
+                'limit': self.limit,
+                'reads': self.reads,
+                'since': self.started,
+                'faults': faults,
+            }
+
+class ThermocoupleGroupTracker(object):
+    '''the ThermocoupleTrackers of a TempSensorGroup seen as one. the
+    kiln is stopped if any one thermocouple is over the error limit.'''
+    def __init__(self, trackers):
+        self.trackers = trackers
+        self.limit = trackers[0].limit
+
+    def error_percent(self):
+        return max(t.error_percent() for t in self.trackers)
+
+    def over_error_limit(self):
+        return any(t.over_error_limit() for t in self.trackers)
+
+    def get_metrics(self):
+        return {
+            'error_percent': self.error_percent(),
+            'limit': self.limit,
+        }
+
 class Max31855(TempSensorReal):
     '''each subclass expected to handle errors and get temperature'''
-    def __init__(self):
-        TempSensorReal.__init__(self)
+    def __init__(self, kiln_config=None, spi_cs=None):
+        TempSensorReal.__init__(self, kiln_config, spi_cs)
         log.info("thermocouple MAX31855")
         import adafruit_max31855
         self.thermocouple = adafruit_max31855.MAX31855(self.spi, self.cs)
@@ -221,8 +639,8 @@ class Max31855(TempSensorReal):
             return self.thermocouple.temperature_NIST
         except RuntimeError as rte:
             if rte.args and rte.args[0]:
-                raise Max31855_Error(rte.args[0])
-            raise Max31855_Error('unknown')
+                raise Max31855_Error(rte.args[0], self.config)
+            raise Max31855_Error('unknown', self.config)
 
 class ThermocoupleError(Exception):
     '''
@@ -230,7 +648,8 @@ class ThermocoupleError(Exception):
     and make them consistent across adafruit libraries. Also set whether
     each exception should be ignored based on settings in config.py.
     '''
-    def __init__(self, message):
+    def __init__(self, message, kiln_config=None):
+        self.config = kiln_config or config
         self.ignore = False
         self.message = message
         self.map_message()
@@ -238,25 +657,25 @@ class ThermocoupleError(Exception):
         super().__init__(self.message)
 
     def set_ignore(self):
-        if self.message == "not connected" and config.ignore_tc_lost_connection == True:
+        if self.message == "not connected" and self.config.ignore_tc_lost_connection == True:
             self.ignore = True
-        if self.message == "short circuit" and config.ignore_tc_short_errors == True:
+        if self.message == "short circuit" and self.config.ignore_tc_short_errors == True:
             self.ignore = True
-        if self.message == "unknown" and config.ignore_tc_unknown_error == True:
+        if self.message == "unknown" and self.config.ignore_tc_unknown_error == True:
             self.ignore = True
-        if self.message == "cold junction range fault" and config.ignore_tc_cold_junction_range_error == True:
+        if self.message == "cold junction range fault" and self.config.ignore_tc_cold_junction_range_error == True:
             self.ignore = True
-        if self.message == "thermocouple range fault" and config.ignore_tc_range_error == True:
+        if self.message == "thermocouple range fault" and self.config.ignore_tc_range_error == True:
             self.ignore = True
-        if self.message == "cold junction temp too high" and config.ignore_tc_cold_junction_temp_high == True:
+        if self.message == "cold junction temp too high" and self.config.ignore_tc_cold_junction_temp_high == True:
             self.ignore = True
-        if self.message == "cold junction temp too low" and config.ignore_tc_cold_junction_temp_low == True:
+        if self.message == "cold junction temp too low" and self.config.ignore_tc_cold_junction_temp_low == True:
             self.ignore = True
-        if self.message == "thermocouple temp too high" and config.ignore_tc_temp_high == True:
+        if self.message == "thermocouple temp too high" and self.config.ignore_tc_temp_high == True:
             self.ignore = True
-        if self.message == "thermocouple temp too low" and config.ignore_tc_temp_low == True:
+        if self.message == "thermocouple temp too low" and self.config.ignore_tc_temp_low == True:
             self.ignore = True
-        if self.message == "voltage too high or low" and config.ignore_tc_voltage_error == True:
+        if self.message == "voltage too high or low" and self.config.ignore_tc_voltage_error == True:
             self.ignore = True
 
     def map_message(self):
@@ -269,7 +688,7 @@ class Max31855_Error(ThermocoupleError):
     '''
     All children must set self.orig_message and self.map
     '''
-    def __init__(self, message):
+    def __init__(self, message, kiln_config=None):
         self.orig_message = message
         # this purposefully makes "fault reading" and
         # "Total thermoelectric voltage out of range..." unknown errors
@@ -278,10 +697,10 @@ class Max31855_Error(ThermocoupleError):
             "short circuit to ground" : "short circuit",
             "short circuit to power" : "short circuit",
             }
-        super().__init__(message)
+        super().__init__(message, kiln_config)
 
 class Max31856_Error(ThermocoupleError):
-    def __init__(self, message):
+    def __init__(self, message, kiln_config=None):
         self.orig_message = message
         self.map = {
             "cj_range" : "cold junction range fault",
@@ -293,17 +712,17 @@ class Max31856_Error(ThermocoupleError):
             "voltage"  : "voltage too high or low", 
             "open_tc"  : "not connected"
             }
-        super().__init__(message)
+        super().__init__(message, kiln_config)
 
 class Max31856(TempSensorReal):
     '''each subclass expected to handle errors and get temperature'''
-    def __init__(self):
-        TempSensorReal.__init__(self)
+    def __init__(self, kiln_config=None, spi_cs=None):
+        TempSensorReal.__init__(self, kiln_config, spi_cs)
         log.info("thermocouple MAX31856")
         import adafruit_max31856
         self.thermocouple = adafruit_max31856.MAX31856(self.spi,self.cs,
-                                        thermocouple_type=config.thermocouple_type)
-        if (config.ac_freq_50hz == True):
+                                        thermocouple_type=self.config.thermocouple_type)
+        if (self.config.ac_freq_50hz == True):
             self.thermocouple.noise_rejection = 50
         else:
             self.thermocouple.noise_rejection = 60
@@ -317,17 +736,20 @@ class Max31856(TempSensorReal):
         temp = self.thermocouple.temperature
         for k,v in self.thermocouple.fault.items():
             if v:
-                raise Max31856_Error(k)
+                raise Max31856_Error(k, self.config)
         return temp
 
 class Oven(threading.Thread):
     '''parent oven class. this has all the common code
-       for either a real or simulated oven'''
-    def __init__(self):
+       for either a real or simulated oven. kiln_config is config.py
+       with the settings of one kiln from config.kilns on top, see
+       lib/kilns.py'''
+    def __init__(self, kiln_config=None):
+        self.config = kiln_config or config
         threading.Thread.__init__(self)
         self.daemon = True
         self.temperature = 0
-        self.time_step = config.sensor_time_wait
+        self.time_step = self.config.sensor_time_wait
         self.reset()
 
     def reset(self):
@@ -340,9 +762,17 @@ class Oven(threading.Thread):
         self.target = 0
         self.heat = 0
         self.heat_rate = 0
-        self.heat_rate_temps = []
-        self.pid = PID(ki=config.pid_ki, kd=config.pid_kd, kp=config.pid_kp)
+        self.heat_rate_tracker = HeatRateTracker(self.config.heat_rate_horizons, self.config.sensor_time_wait)
+        self.heat_rates = self.heat_rate_tracker.rates()
+        self.pid = PID(ki=self.config.pid_ki, kd=self.config.pid_kd, kp=self.config.pid_kp, kiln_config=self.config)
         self.catching_up = False
+        # how the last run ended: complete, stopped or emergency
+        self.outcome = None
+
+    def now(self):
+        '''the clock the schedule runs on. subclasses can replace this
+        with a virtual clock.'''
+        return datetime.datetime.now()
 
     @staticmethod
     def get_start_from_temperature(profile, temp):
@@ -354,64 +784,66 @@ class Oven(threading.Thread):
             startat = 0
         return startat
 
-    def set_heat_rate(self,runtime,temp):
-        '''heat rate is the heating rate in degrees/hour
+    def heat_rate_clock(self):
+        '''seconds on the clock the heat rate is measured with'''
+        return time.monotonic()
+
+    def update_heat_rate(self):
+        '''heat rate is the heating rate in degrees/hour. this is called
+        once per tick of the control loop.
+        inputs
+            config.heat_rate_horizons
         '''
-        # arbitrary number of samples
-        # the time this covers changes based on a few things
-        numtemps = 60
-        self.heat_rate_temps.append((runtime,temp))
-         
-        # drop old temps off the list
-        if len(self.heat_rate_temps) > numtemps:
-            self.heat_rate_temps = self.heat_rate_temps[-1*numtemps:]
-        time2 = self.heat_rate_temps[-1][0]
-        time1 = self.heat_rate_temps[0][0]
-        temp2 = self.heat_rate_temps[-1][1]
-        temp1 = self.heat_rate_temps[0][1]
-        if time2 > time1:
-            self.heat_rate = ((temp2 - temp1) / (time2 - time1))*3600
+        try:
+            temp = self.board.temp_sensor.temperature() + self.config.thermocouple_offset
+        except AttributeError:
+            # this happens at start-up with a simulated oven
+            return
+        self.heat_rate_tracker.add(self.heat_rate_clock(), temp)
+        self.heat_rates = self.heat_rate_tracker.rates()
+        self.heat_rate = self.heat_rates[self.config.heat_rate_horizons[0]]
 
     def run_profile(self, profile, startat=0, allow_seek=True):
         log.debug('run_profile run on thread' + threading.current_thread().name)
         runtime = startat * 60
         if allow_seek:
             if self.state == 'IDLE':
-                if config.seek_start:
+                if self.config.seek_start:
                     temp = self.board.temp_sensor.temperature()  # Defined in a subclass
                     runtime += self.get_start_from_temperature(profile, temp)
 
         self.reset()
         self.startat = startat * 60
         self.runtime = runtime
-        self.start_time = datetime.datetime.now() - datetime.timedelta(seconds=self.startat)
+        self.start_time = self.now() - datetime.timedelta(seconds=self.startat)
         self.profile = profile
         self.totaltime = profile.get_duration()
         self.state = "RUNNING"
         log.info("Running schedule %s starting at %d minutes" % (profile.name,startat))
         log.info("Starting")
 
-    def abort_run(self):
+    def abort_run(self, outcome="stopped"):
         self.reset()
+        self.outcome = outcome
         self.save_automatic_restart_state()
 
     def get_start_time(self):
-        return datetime.datetime.now() - datetime.timedelta(milliseconds = self.runtime * 1000)
+        return self.now() - datetime.timedelta(milliseconds = self.runtime * 1000)
 
     def kiln_must_catch_up(self):
         '''shift the whole schedule forward in time by one time_step
         to wait for the kiln to catch up'''
-        if config.kiln_must_catch_up == True:
+        if self.config.kiln_must_catch_up == True:
             temp = self.board.temp_sensor.temperature() + \
-                config.thermocouple_offset
+                self.config.thermocouple_offset
             # kiln too cold, wait for it to heat up
-            if self.target - temp > config.pid_control_window:
+            if self.target - temp > self.config.pid_control_window:
                 log.info("kiln must catch up, too cold, shifting schedule")
                 self.start_time = self.get_start_time()
                 self.catching_up = True;
                 return
             # kiln too hot, wait for it to cool down
-            if temp - self.target > config.pid_control_window:
+            if temp - self.target > self.config.pid_control_window:
                 log.info("kiln must catch up, too hot, shifting schedule")
                 self.start_time = self.get_start_time()
                 self.catching_up = True;
@@ -420,7 +852,7 @@ class Oven(threading.Thread):
 
     def update_runtime(self):
 
-        runtime_delta = datetime.datetime.now() - self.start_time
+        runtime_delta = self.now() - self.start_time
         if runtime_delta.total_seconds() < 0:
             runtime_delta = datetime.timedelta(0)
 
@@ -431,26 +863,26 @@ class Oven(threading.Thread):
 
     def reset_if_emergency(self):
         '''reset if the temperature is way TOO HOT, or other critical errors detected'''
-        if (self.board.temp_sensor.temperature() + config.thermocouple_offset >=
-            config.emergency_shutoff_temp):
+        if (self.board.temp_sensor.temperature() + self.config.thermocouple_offset >=
+            self.config.emergency_shutoff_temp):
             log.info("emergency!!! temperature too high")
-            if config.ignore_temp_too_high == False:
-                self.abort_run()
+            if self.config.ignore_temp_too_high == False:
+                self.abort_run("emergency")
         
         if self.board.temp_sensor.status.over_error_limit():
             log.info("emergency!!! too many errors in a short period")
-            if config.ignore_tc_too_many_errors == False:
-                self.abort_run()
+            if self.config.ignore_tc_too_many_errors == False:
+                self.abort_run("emergency")
 
     def reset_if_schedule_ended(self):
         if self.runtime > self.totaltime:
             log.info("schedule ended, shutting down")
-            log.info("total cost = %s%.2f" % (config.currency_type,self.cost))
-            self.abort_run()
+            log.info("total cost = %s%.2f" % (self.config.currency_type,self.cost))
+            self.abort_run("complete")
 
     def update_cost(self):
         if self.heat:
-            cost = (config.kwh_rate * config.kw_elements) * ((self.heat)/3600)
+            cost = (self.config.kwh_rate * self.config.kw_elements) * ((self.heat)/3600)
         else:
             cost = 0
         self.cost = self.cost + cost
@@ -458,14 +890,12 @@ class Oven(threading.Thread):
     def get_state(self):
         temp = 0
         try:
-            temp = self.board.temp_sensor.temperature() + config.thermocouple_offset
+            temp = self.board.temp_sensor.temperature() + self.config.thermocouple_offset
         except AttributeError as error:
             # this happens at start-up with a simulated oven
             temp = 0
             pass
 
-        self.set_heat_rate(self.runtime,temp)
-
         state = {
             'cost': self.cost,
             'runtime': self.runtime,
@@ -474,17 +904,28 @@ class Oven(threading.Thread):
             'state': self.state,
             'heat': self.heat,
             'heat_rate': self.heat_rate,
+            'heat_rates': {str(h): r for h, r in self.heat_rates.items()},
             'totaltime': self.totaltime,
-            'kwh_rate': config.kwh_rate,
-            'currency_type': config.currency_type,
+            'kwh_rate': self.config.kwh_rate,
+            'currency_type': self.config.currency_type,
             'profile': self.profile.name if self.profile else None,
             'pidstats': self.pid.pidstats,
             'catching_up': self.catching_up,
+            'temperatures': self.get_temperatures(),
         }
         return state
 
+    def get_temperatures(self):
+        '''{name: temperature} of each thermocouple when there are more
+        than one, see config.thermocouples'''
+        try:
+            temps = self.board.temp_sensor.temperatures()
+        except AttributeError:
+            return {}
+        return {name: t + self.config.thermocouple_offset for name, t in temps.items()}
+
     def save_state(self):
-        with open(config.automatic_restart_state_file, 'w', encoding='utf-8') as f:
+        with open(self.config.automatic_restart_state_file, 'w', encoding='utf-8') as f:
             json.dump(self.get_state(), f, ensure_ascii=False, indent=4)
 
     def state_file_is_old(self):
@@ -492,29 +933,29 @@ class Oven(threading.Thread):
                    False if younger
                    True if state file cannot be opened or does not exist
         '''
-        if os.path.isfile(config.automatic_restart_state_file):
-            state_age = os.path.getmtime(config.automatic_restart_state_file)
+        if os.path.isfile(self.config.automatic_restart_state_file):
+            state_age = os.path.getmtime(self.config.automatic_restart_state_file)
             now = time.time()
             minutes = (now - state_age)/60
-            if(minutes <= config.automatic_restart_window):
+            if(minutes <= self.config.automatic_restart_window):
                 return False
         return True
 
     def save_automatic_restart_state(self):
         # only save state if the feature is enabled
-        if not config.automatic_restarts == True:
+        if not self.config.automatic_restarts == True:
             return False
         self.save_state()
 
     def should_i_automatic_restart(self):
         # only automatic restart if the feature is enabled
-        if not config.automatic_restarts == True:
+        if not self.config.automatic_restarts == True:
             return False
         if self.state_file_is_old():
             duplog.info("automatic restart not possible. state file does not exist or is too old.")
             return False
 
-        with open(config.automatic_restart_state_file) as infile:
+        with open(self.config.automatic_restart_state_file) as infile:
             d = json.load(infile)
         if d["state"] != "RUNNING":
             duplog.info("automatic restart not possible. state = %s" % (d["state"]))
@@ -522,15 +963,15 @@ class Oven(threading.Thread):
         return True
 
     def automatic_restart(self):
-        with open(config.automatic_restart_state_file) as infile: d = json.load(infile)
+        with open(self.config.automatic_restart_state_file) as infile: d = json.load(infile)
         startat = d["runtime"]/60
-        filename = "%s.json" % (d["profile"])
-        profile_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'storage','profiles',filename))
 
-        log.info("automatically restarting profile = %s at minute = %d" % (profile_path,startat))
-        with open(profile_path) as infile:
-            profile_json = json.dumps(json.load(infile))
-        profile = Profile(profile_json)
+        profile = self.get_profile_store().get_profile(d["profile"])
+        if profile is None:
+            duplog.info("automatic restart not possible. profile %s not found." % (d["profile"]))
+            return
+
+        log.info("automatically restarting profile = %s at minute = %d" % (d["profile"],startat))
         self.run_profile(profile, startat=startat, allow_seek=False)  # We don't want a seek on an auto restart.
         self.cost = d["cost"]
         time.sleep(1)
@@ -540,10 +981,23 @@ class Oven(threading.Thread):
         log.info("ovenwatcher set in oven class")
         self.ovenwatcher = watcher
 
+    def set_profile_store(self,store):
+        log.info("profile store set in oven class")
+        self.profile_store = store
+
+    def get_profile_store(self):
+        '''the profile store shared with the web server, or one of our own
+        if this oven was created without one (kiln-tuner.py)'''
+        if getattr(self, "profile_store", None) is None:
+            from profileStore import ProfileStore
+            self.profile_store = ProfileStore(self.config.kiln_profiles_directory)
+        return self.profile_store
+
     def run(self):
         while True:
             log.debug('Oven running on ' + threading.current_thread().name)
             if self.state == "IDLE":
+                self.update_heat_rate()
                 if self.should_i_automatic_restart() == True:
                     self.automatic_restart()
                 time.sleep(1)
@@ -553,6 +1007,7 @@ class Oven(threading.Thread):
                 self.update_runtime()
                 self.update_target_temp()
                 self.heat_then_cool()
+                self.update_heat_rate()
                 self.reset_if_emergency()
                 self.reset_if_schedule_ended()
                 continue
@@ -563,40 +1018,111 @@ class Oven(threading.Thread):
                 self.update_runtime()
                 self.update_target_temp()
                 self.heat_then_cool()
+                self.update_heat_rate()
                 self.reset_if_emergency()
                 self.reset_if_schedule_ended()
 
 class SimulatedOven(Oven):
-
-    def __init__(self):
-        self.board = SimulatedBoard()
-        self.t_env = config.sim_t_env
-        self.c_heat = config.sim_c_heat
-        self.c_oven = config.sim_c_oven
-        self.p_heat = config.sim_p_heat
-        self.R_o_nocool = config.sim_R_o_nocool
-        self.R_ho_noair = config.sim_R_ho_noair
+    '''simulated oven. by default this runs on its own thread against
+    the wall clock (sped up by self.config.sim_speedup_factor). with
+    headless=True no thread is started and time is a virtual clock that
+    moves forward one time_step per tick, see simulate().
+    '''
+    def __init__(self, headless=False, kiln_config=None):
+        self.config = kiln_config or config
+        self.board = self.make_board()
+        self.t_env = self.config.sim_t_env
+        self.c_heat = self.config.sim_c_heat
+        self.c_oven = self.config.sim_c_oven
+        self.p_heat = self.config.sim_p_heat
+        self.R_o_nocool = self.config.sim_R_o_nocool
+        self.R_ho_noair = self.config.sim_R_ho_noair
         self.R_ho = self.R_ho_noair
-        self.speedup_factor = config.sim_speedup_factor
+        self.speedup_factor = self.config.sim_speedup_factor
+        self.headless = headless
+        self.sim_now = datetime.datetime.now()
+        # seconds of simulated heating and cooling so far
+        self.sim_seconds = 0
+        if self.headless:
+            self.speedup_factor = 1
 
         # set temps to the temp of the surrounding environment
-        self.t = config.sim_t_env  # deg C or F temp of oven
+        self.t = self.config.sim_t_env  # deg C or F temp of oven
         self.t_h = self.t_env #deg C temp of heating element
 
-        super().__init__()
+        super().__init__(self.config)
 
         self.start_time = self.get_start_time();
 
+        if self.headless:
+            log.info("SimulatedOven created, headless")
+            return
+
         # start thread
         self.start()
         log.info("SimulatedOven started")
 
+    def make_board(self):
+        return SimulatedBoard(self.config)
+
+    def now(self):
+        if self.headless:
+            return self.sim_now
+        return super().now()
+
+    def heat_rate_clock(self):
+        # each tick simulates time_step seconds, however fast it runs
+        return self.sim_seconds
+
+    def save_automatic_restart_state(self):
+        # a headless simulation must never overwrite the real state file
+        if self.headless:
+            return False
+        return super().save_automatic_restart_state()
+
+    def simulate(self, profile, kp=None, ki=None, kd=None, startat=0, allow_seek=True):
+        '''run a whole profile on the virtual clock as fast as possible
+        using the same control steps as run(). returns a list with one
+        dict per time_step. only valid with headless=True.
+        '''
+        if not self.headless:
+            raise RuntimeError("simulate() requires SimulatedOven(headless=True)")
+
+        self.t = self.t_env
+        self.t_h = self.t_env
+        self.board.temp_sensor.simulated_temperature = self.t
+        self.run_profile(profile, startat=startat, allow_seek=allow_seek)
+        self.pid = PID(ki=self.config.pid_ki if ki is None else ki,
+                       kd=self.config.pid_kd if kd is None else kd,
+                       kp=self.config.pid_kp if kp is None else kp,
+                       kiln_config=self.config)
+        self.pid.lastNow = self.now() - datetime.timedelta(seconds=self.time_step)
+
+        trace = []
+        while self.state == "RUNNING":
+            self.update_cost()
+            self.kiln_must_catch_up()
+            self.update_runtime()
+            self.update_target_temp()
+            self.heat_then_cool()
+            self.update_heat_rate()
+            self.reset_if_emergency()
+            trace.append({
+                'runtime': self.runtime,
+                'temperature': self.t + self.config.thermocouple_offset,
+                'target': self.target,
+                'out': self.pid.pidstats.get('out', 0),
+                'catching_up': self.catching_up,
+                })
+            self.reset_if_schedule_ended()
+        return trace
+
     # runtime is in sped up time, start_time is actual time of day
     def get_start_time(self):
-        return datetime.datetime.now() - datetime.timedelta(milliseconds = self.runtime * 1000 / self.speedup_factor)
+        return self.now() - datetime.timedelta(milliseconds = self.runtime * 1000 / self.speedup_factor)
 
     def update_runtime(self):
-        runtime_delta = datetime.datetime.now() - self.start_time
+        runtime_delta = self.now() - self.start_time
         if runtime_delta.total_seconds() < 0:
             runtime_delta = datetime.timedelta(0)
 
@@ -626,12 +1152,13 @@ class SimulatedOven(Oven):
         self.t -= self.p_env * self.time_step / self.c_oven
         self.temperature = self.t
         self.board.temp_sensor.simulated_temperature = self.t
+        self.sim_seconds += self.time_step
 
     def heat_then_cool(self):
         now_simulator = self.start_time + datetime.timedelta(milliseconds = self.runtime * 1000)
         pid = self.pid.compute(self.target,
                                self.board.temp_sensor.temperature() +
-                               config.thermocouple_offset, now_simulator)
+                               self.config.thermocouple_offset, now_simulator)
 
         heat_on = float(self.time_step * pid)
         heat_off = float(self.time_step * (1 - pid))
@@ -644,6 +1171,11 @@ class SimulatedOven(Oven):
         if heat_on > 0:
             self.heat = heat_on
 
+        if self.headless:
+            # nothing to wait for, just move the virtual clock
+            self.sim_now += datetime.timedelta(seconds=self.time_step)
+            return
+
         log.info("simulation: -> %dW heater: %.0f -> %dW oven: %.0f -> %dW env" % (int(self.p_heat * pid),
             self.t_h,
             int(self.p_ho),
@@ -674,15 +1206,53 @@ class SimulatedOven(Oven):
         time.sleep(self.time_step / self.speedup_factor)
 
 
+class ReplayOven(SimulatedOven):
+    '''runs the control loop against a recorded firing instead of the
+    simulator, headless and as fast as the cpu goes. the temperature
+    follows the trace whatever the pid decides, so this is for checking
+    what the current safety and control code does with a real firing
+    (emergency stops, thermocouple error limits, catching up), not how
+    well it would have fired. see kiln-replay.py.
+    '''
+    def __init__(self, trace, kiln_config=None):
+        self.trace = trace
+        super().__init__(headless=True, kiln_config=kiln_config)
+
+    def make_board(self):
+        return ReplayBoard(TempSensorReplay(self.trace, self.replay_clock, self.config), self.config)
+
+    def replay_clock(self):
+        return self.sim_seconds
+
+    def simulate(self, profile, kp=None, ki=None, kd=None, startat=0, allow_seek=True):
+        '''replay the trace from the start against profile, see
+        SimulatedOven.simulate'''
+        self.sim_seconds = 0
+        self.board.temp_sensor.rewind()
+        return super().simulate(profile, kp, ki, kd, startat, allow_seek)
+
+    def temp_changes(self):
+        self.sim_seconds += self.time_step
+        self.t = self.board.temp_sensor.temperature()
+        self.temperature = self.t
+
+    def reset_if_schedule_ended(self):
+        if self.state == "RUNNING" and self.board.temp_sensor.finished():
+            log.info("replay reached the end of the trace")
+            self.abort_run("stopped")
+            return
+        super().reset_if_schedule_ended()
+
 class RealOven(Oven):
 
-    def __init__(self):
-        self.board = RealBoard()
-        self.output = Output()
+    def __init__(self, kiln_config=None):
+        self.config = kiln_config or config
+        self.board = RealBoard(self.config)
+        self.output = Output(self.config)
         self.reset()
 
         # call parent init
-        Oven.__init__(self)
+        Oven.__init__(self, self.config)
 
         # start thread
         self.start()
@@ -694,7 +1264,7 @@ class RealOven(Oven):
     def heat_then_cool(self):
         pid = self.pid.compute(self.target,
                                self.board.temp_sensor.temperature() +
-                               config.thermocouple_offset, datetime.datetime.now())
+                               self.config.thermocouple_offset, datetime.datetime.now())
 
         heat_on = float(self.time_step * pid)
         heat_off = float(self.time_step * (1 - pid))
@@ -728,12 +1298,71 @@ class RealOven(Oven):
 
 class Profile():
     def __init__(self, json_data):
-        obj = json.loads(json_data)
+        '''json_data is a json string or an already parsed profile dict'''
+        if isinstance(json_data, dict):
+            obj = json_data
+        else:
+            obj = json.loads(json_data)
         self.name = obj["name"]
-        self.data = sorted(obj["data"])
+        compiled = obj.get("compiled")
+        # compiled blocks from before temp_units was kept in them are c.
+        # the points must match exactly, they may have been edited since
+        if (compiled and compiled.get("temp_units", "c") == obj.get("temp_units") and
+                compiled["times"] == [float(t) for (t, x) in obj["data"]] and
+                compiled["temps"] == [float(x) for (t, x) in obj["data"]]):
+            # compiled by validate_profile when the profile was saved,
+            # the points are already sorted and checked
+            self.data = obj["data"]
+            self.times = compiled["times"]
+            self.temps = compiled["temps"]
+            self.slopes = compiled["slopes"]
+            self.duration = compiled["duration"]
+            self.last_segment = 0
+        else:
+            self.data = sorted(obj["data"])
+            self.compile()
+        self.build_seek_index()
+
+    def compile(self):
+        '''get_target_temperature is called every time_step for the whole
+        firing, so split the points into parallel time/temp lists and
+        work out the slope of every segment once, up front.
+        '''
+        self.times = [float(t) for (t, x) in self.data]
+        self.temps = [float(x) for (t, x) in self.data]
+        self.slopes = []
+        for i in range(1, len(self.data)):
+            dt = self.times[i] - self.times[i-1]
+            if dt > 0:
+                self.slopes.append((self.temps[i] - self.temps[i-1]) / dt)
+            else:
+                # zero length segment, bisect never lands here
+                self.slopes.append(0.0)
+        self.duration = max([t for (t, x) in self.data]) if self.data else 0
+        # segment used by the last lookup. a running kiln asks for
+        # times in order, so the next answer is almost always here.
+        self.last_segment = 0
 
     def get_duration(self):
-        return max([t for (t, x) in self.data])
+        return self.duration
+
+    def find_segment(self, time):
+        '''returns index i of the segment where times[i] <= time < times[i+1].
+        checks the segment from the last lookup and the one after it
+        before falling back to a binary search.
+        '''
+        times = self.times
+        last = len(times) - 2
+        i = self.last_segment
+        if i <= last and times[i] <= time < times[i+1]:
+            return i
+        if i + 1 <= last and times[i+1] <= time < times[i+2]:
+            self.last_segment = i + 1
+            return i + 1
+        i = bisect.bisect_right(times, time) - 1
+        i = min(max(i, 0), last)
+        self.last_segment = i
+        return i
 
     #  x = (y-y1)(x2-x1)/(y2-y1) + x1
     @staticmethod
@@ -743,49 +1372,76 @@ class Profile():
         x = (y - point1[1]) * (point2[0] -point1[0] ) / (point2[1] - point1[1]) + point1[0]
         return x
 
+    def build_seek_index(self):
+        '''highest temperature the schedule has reached at each point.
+        it never goes down, so the first point to reach a temperature
+        can be found with a binary search.
+        '''
+        self.peak_temps = []
+        peak = float("-inf")
+        for temp in self.temps:
+            if temp > peak:
+                peak = temp
+            self.peak_temps.append(peak)
+
     def find_next_time_from_temperature(self, temperature):
-        time = 0 # The seek function will not do anything if this returns zero, no useful intersection was found
-        for index, point2 in enumerate(self.data):
-            if point2[1] >= temperature:
-                if index > 0: #  Zero here would be before the first segment
-                    if self.data[index - 1][1] <= temperature: # We have an intersection
-                        time = self.find_x_given_y_on_line_from_two_points(temperature, self.data[index - 1], point2)
-                        if time == 0:
-                            if self.data[index - 1][1] == point2[1]: # It's a flat segment that matches the temperature
-                                time = self.data[index - 1][0]
-                                break
-
-        return time
+        '''earliest time the schedule reaches temperature. if it reaches
+        it at the start of a hold, that is the start of the hold. returns
+        0 if the schedule starts at or above temperature or never gets
+        there, the seek function does nothing with zero.
+        '''
+        i = bisect.bisect_left(self.peak_temps, temperature)
+        if i == 0 or i == len(self.peak_temps):
+            return 0
+        # every point before i is below temperature and point i is at or
+        # above it, so this segment is rising and crosses it
+        return self.find_x_given_y_on_line_from_two_points(temperature,
+            (self.times[i-1], self.temps[i-1]), (self.times[i], self.temps[i]))
 
     def get_surrounding_points(self, time):
-        if time > self.get_duration():
+        if time > self.duration or len(self.data) < 2:
             return (None, None)
 
-        prev_point = None
-        next_point = None
-
-        for i in range(len(self.data)):
-            if time < self.data[i][0]:
-                prev_point = self.data[i-1]
-                next_point = self.data[i]
-                break
-
-        return (prev_point, next_point)
+        i = self.find_segment(time)
+        return (self.data[i], self.data[i+1])
 
     def get_target_temperature(self, time):
-        if time > self.get_duration():
+        if time > self.duration:
             return 0
+        if len(self.times) < 2:
+            return self.temps[0] if self.temps else 0
 
-        (prev_point, next_point) = self.get_surrounding_points(time)
+        i = self.find_segment(time)
+        return self.temps[i] + (time - self.times[i]) * self.slopes[i]
 
-        incl = float(next_point[1] - prev_point[1]) / float(next_point[0] - prev_point[0])
-        temp = prev_point[1] + (time - prev_point[0]) * incl
-        return temp
+    def get_target_temperatures(self, times):
+        '''get_target_temperature for a whole list of times in one call.
+        this is for charts, csv exports and simulations that need
+        thousands of targets at once. uses numpy if it is installed and
+        returns a numpy array, otherwise returns a list.
+        '''
+        try:
+            import numpy
+        except ImportError:
+            return [self.get_target_temperature(t) for t in times]
+
+        t = numpy.asarray(times, dtype=float)
+        if len(self.times) < 2:
+            first = self.temps[0] if self.temps else 0
+            return numpy.where(t > self.duration, 0.0, first)
+
+        pts = numpy.asarray(self.times)
+        i = numpy.searchsorted(pts, t, side='right') - 1
+        i = numpy.clip(i, 0, len(pts) - 2)
+        temps = numpy.asarray(self.temps)[i] + (t - pts[i]) * numpy.asarray(self.slopes)[i]
+        temps[t > self.duration] = 0
+        return temps
 
 
 class PID():
 
-    def __init__(self, ki=1, kp=1, kd=1):
+    def __init__(self, ki=1, kp=1, kd=1, kiln_config=None):
+        self.config = kiln_config or config
         self.ki = ki
         self.kp = kp
         self.kd = kd
@@ -806,26 +1462,26 @@ class PID():
 
         error = float(setpoint - ispoint)
 
-        # this removes the need for config.stop_integral_windup
+        # this removes the need for self.config.stop_integral_windup
         # it turns the controller into a binary on/off switch
         # any time it's outside the window defined by
-        # config.pid_control_window
+        # self.config.pid_control_window
         icomp = 0
         output = 0
         out4logs = 0
         dErr = 0
-        if error < (-1 * config.pid_control_window):
+        if error < (-1 * self.config.pid_control_window):
             log.info("kiln outside pid control window, max cooling")
             output = 0
             # it is possible to set self.iterm=0 here and also below
             # but I dont think its needed
-        elif error > (1 * config.pid_control_window):
+        elif error > (1 * self.config.pid_control_window):
             log.info("kiln outside pid control window, max heating")
             output = 1
-            if config.throttle_below_temp and config.throttle_percent:
-                if setpoint <= config.throttle_below_temp:
-                    output = config.throttle_percent/100
-                    log.info("max heating throttled at %d percent below %d degrees to prevent overshoot" % (config.throttle_percent,config.throttle_below_temp))
+            if self.config.throttle_below_temp and self.config.throttle_percent:
+                if setpoint <= self.config.throttle_below_temp:
+                    output = self.config.throttle_percent/100
+                    log.info("max heating throttled at %d percent below %d degrees to prevent overshoot" % (self.config.throttle_percent,self.config.throttle_below_temp))
         else:
             icomp = (error * timeDelta * (1/self.ki))
             self.iterm += (error * timeDelta * (1/self.ki))
@@ -1,18 +1,42 @@
-import threading,logging,json,time,datetime
-from oven import Oven
+import threading,logging,time,datetime,os
+from runHistory import RunHistory
+from statusHub import StatusHub
+from rollingStats import RollingStats
+import wireFormat
 log = logging.getLogger(__name__)
 
 class OvenWatcher(threading.Thread):
-    def __init__(self,oven):
+    '''records the oven and sends its state to websocket clients. with
+    headless=True no thread is started and the history is only kept in
+    memory, for benchmarks and tests.'''
+    def __init__(self,oven,headless=False):
         self.last_profile = None
-        self.last_log = []
         self.started = None
         self.recording = False
-        self.observers = []
         threading.Thread.__init__(self)
         self.daemon = True
         self.oven = oven
-        self.start()
+        self.headless = headless
+        self.run_archive = None
+        self.run_id = None
+        self.history = self.create_history()
+        self.stats = RollingStats(self.oven.config.rolling_stats_windows, self.oven.config.pid_control_window)
+        self.observers = StatusHub(self.oven.config.status_queue_size)
+        if not self.headless:
+            self.start()
+
+    def create_history(self):
+        '''samples of the current run for any new clients that join.
+        inputs
+            config.history_max_samples
+            config.history_spill_directory
+        '''
+        config = self.oven.config
+        if self.headless:
+            return RunHistory(config.history_max_samples)
+        kiln_id = getattr(config, "kiln_id", "default")
+        spill_file = os.path.join(config.history_spill_directory, "history-%s.bin" % kiln_id)
+        return RunHistory(config.history_max_samples, spill_file)
 
 # FIXME - need to save runs of schedules in near-real-time
 # FIXME - this will enable re-start in case of power outage
@@ -28,29 +52,63 @@ class OvenWatcher(threading.Thread):
            
             # record state for any new clients that join
             if oven_state.get("state") == "RUNNING":
-                self.last_log.append(oven_state)
+                self.stats.add(oven_state)
+                self.history.append(oven_state)
+                self.archive(oven_state)
             else:
                 self.recording = False
+                if oven_state.get("state") != "PAUSED":
+                    self.end_archived_run()
+            oven_state['stats'] = self.stats.get()
             self.notify_all(oven_state)
             time.sleep(self.oven.time_step)
 
     def lastlog_subset(self,maxpts=50):
-        '''send about maxpts from lastlog by skipping unwanted data'''
-        totalpts = len(self.last_log)
-        if (totalpts <= maxpts):
-            return self.last_log
-        every_nth = int(totalpts / (maxpts - 1))
-        return self.last_log[::every_nth]
+        '''send at most maxpts from the history, keeping the highs and
+        lows of the temperature so spikes and overshoots still show'''
+        return self.history.rows(self.history.decimated(maxpts))
+
+    def history_window(self, start=None, end=None, maxpts=500, fields=None):
+        '''at most maxpts samples recorded between the unix times start
+        and end, keeping the highs and lows of the temperature. with
+        fields, only those fields and the time are returned.'''
+        rows = self.history.rows(self.history.window(start, end, maxpts))
+        if fields:
+            fields = ['time'] + [f for f in fields if f != 'time']
+            rows = [{f: row[f] for f in fields} for row in rows]
+        return rows
+
+    def set_run_archive(self, archive):
+        '''every run is also saved in this RunArchive'''
+        self.run_archive = archive
+
+    def archive(self, oven_state):
+        if self.run_archive and self.run_id is not None:
+            self.run_archive.add_sample(self.run_id, oven_state)
+
+    def end_archived_run(self):
+        if self.run_archive and self.run_id is not None:
+            self.run_archive.end_run(self.run_id, self.oven.outcome or "stopped")
+        self.run_id = None
 
     def record(self, profile):
         self.last_profile = profile
-        self.last_log = []
+        self.history.clear()
+        self.stats.clear()
         self.started = datetime.datetime.now()
         self.recording = True
+        if self.run_archive:
+            # a run that is replaced by a new one never finished
+            if self.run_id is not None:
+                self.run_archive.end_run(self.run_id, "interrupted")
+            kiln_id = getattr(self.oven.config, "kiln_id", "default")
+            self.run_id = self.run_archive.start_run(kiln_id, profile.name)
         #we just turned on, add first state for nice graph
-        self.last_log.append(self.oven.get_state())
+        oven_state = self.oven.get_state()
+        self.history.append(oven_state)
+        self.archive(oven_state)
 
-    def add_observer(self,observer):
+    def add_observer(self,observer,delta=False,fmt="json"):
         if self.last_profile:
             p = {
                 "name": self.last_profile.name,
@@ -66,26 +124,15 @@ class OvenWatcher(threading.Thread):
             'log': self.lastlog_subset(),
             #'started': self.started
         }
-        print(backlog)
-        backlog_json = json.dumps(backlog)
-        try:
-            print(backlog_json)
-            observer.send(backlog_json)
-        except:
-            log.error("Could not send backlog to new observer")
-        
-        self.observers.append(observer)
+        log.debug("sending backlog of %d samples as %s" % (len(backlog['log']), fmt))
+        message = wireFormat.dumps(backlog, fmt)
+        # the backlog goes out first, before any new state
+        self.observers.subscribe(observer, message, delta, fmt)
 
-    def notify_all(self,message):
-        message_json = json.dumps(message)
-        log.debug("sending to %d clients: %s"%(len(self.observers),message_json))
+    def remove_observer(self,observer):
+        self.observers.unsubscribe(observer)
 
-        for wsock in self.observers:
-            if wsock:
-                try:
-                    wsock.send(message_json)
-                except:
-                    log.error("could not write to socket %s"%wsock)
-                    self.observers.remove(wsock)
-            else:
-                self.observers.remove(wsock)
+    def notify_all(self,message):
+        # serialized once, every client gets the same string
+        sent = self.observers.publish(message)
+        log.debug("sending to %d clients: %s"%(len(self.observers),sent[("full", "json")]))
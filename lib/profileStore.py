@@ -0,0 +1,247 @@
+import os
+import json
+import math
+import logging
+import threading
+import config
+from oven import Profile
+import wireFormat
+
+log = logging.getLogger(__name__)
+
+class ProfileError(Exception):
+    '''a profile that can not be saved or run'''
+    pass
+
+class ProfileStore(object):
+    '''Keeps every profile in the profiles directory parsed and in memory,
+    keyed by name, along with the json list sent to the browser.
+    Files are only re-read when their mtime or size changes, so asking
+    for the profiles is a directory scan instead of opening and parsing
+    every file.
+    inputs
+        config.temp_scale
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # filename -> (mtime_ns, size, profile dict or None if it could
+        # not be loaded)
+        self.files = {}
+        self.by_name = {}
+        self.filenames = {}
+        # name -> Profile, built the first time a profile is run
+        self.compiled = {}
+        self.profiles_json = None
+        # format -> the profile list in that format, see wireFormat
+        self.profiles_encoded = {}
+
+    def refresh(self):
+        '''re-read any profile files that were added, changed or removed'''
+        try:
+            entries = [e for e in os.scandir(self.path) if e.is_file()]
+        except OSError:
+            entries = []
+
+        changed = False
+        seen = set()
+        for entry in entries:
+            seen.add(entry.name)
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            cached = self.files.get(entry.name)
+            if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                continue
+            try:
+                with open(entry.path, 'r') as f:
+                    profile = json.load(f)
+                if not isinstance(profile, dict) or not isinstance(profile.get('name'), str):
+                    raise ValueError("profile has no name")
+            except (OSError, ValueError) as e:
+                log.error("Could not load profile %s: %s" % (entry.path, e))
+                # remembered so the file is not read again until it changes
+                if not (cached and cached[2] is None):
+                    changed = True
+                self.files[entry.name] = (st.st_mtime_ns, st.st_size, None)
+                continue
+            profile = normalize_temp_units([profile])[0]
+            self.files[entry.name] = (st.st_mtime_ns, st.st_size, profile)
+            changed = True
+
+        for filename in list(self.files):
+            if filename not in seen:
+                del self.files[filename]
+                changed = True
+
+        if changed or self.profiles_json is None:
+            loaded = [f for f in sorted(self.files) if self.files[f][2] is not None]
+            profiles = [self.files[f][2] for f in loaded]
+            self.by_name = {p['name']: p for p in profiles}
+            self.filenames = {self.files[f][2]['name']: f for f in loaded}
+            self.compiled = {}
+            # the browser only needs the points
+            self.profiles_list = [{k: v for k, v in p.items() if k != "compiled"} for p in profiles]
+            self.profiles_json = json.dumps(self.profiles_list)
+            self.profiles_encoded = {"json": self.profiles_json}
+
+    def unchanged(self, filename):
+        '''True if filename is cached and has not changed on disk'''
+        cached = self.files.get(filename)
+        if not cached:
+            return False
+        try:
+            st = os.stat(os.path.join(self.path, filename))
+        except OSError:
+            return False
+        return cached[0] == st.st_mtime_ns and cached[1] == st.st_size
+
+    def invalidate(self, filename=None):
+        '''forget one file, or everything, so the next refresh re-reads it'''
+        with self.lock:
+            if filename is None:
+                self.files = {}
+            else:
+                self.files.pop(filename, None)
+            self.compiled = {}
+            self.profiles_json = None
+
+    def get_profile(self, name):
+        '''returns a Profile ready to run, or None if there is no profile
+        with that name. only the one file is checked when it is already
+        cached, so this does not get slower as the library grows.
+        '''
+        with self.lock:
+            filename = self.filenames.get(name)
+            if not (filename and self.unchanged(filename)):
+                self.refresh()
+            if name not in self.by_name:
+                return None
+            if name not in self.compiled:
+                self.compiled[name] = Profile(self.by_name[name])
+            return self.compiled[name]
+
+    def get_profiles_json(self):
+        '''json list of all profiles in config.temp_scale'''
+        with self.lock:
+            self.refresh()
+            return self.profiles_json
+
+    def get_profiles_encoded(self, fmt="json"):
+        '''get_profiles_json in any format from wireFormat'''
+        with self.lock:
+            self.refresh()
+            if fmt not in self.profiles_encoded:
+                self.profiles_encoded[fmt] = wireFormat.dumps(self.profiles_list, fmt)
+            return self.profiles_encoded[fmt]
+
+
+def validate_profile(profile):
+    '''
+    check a profile sent by the browser and put it in the form it is
+    stored in: degrees c, points sorted by time with no duplicate times,
+    and a compiled copy of the segments (times, temps, slopes, duration)
+    so loading it for a run does not have to sort or check it again.
+    returns a new profile dict or raises ProfileError.
+    '''
+    name = profile.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ProfileError("profile has no name")
+    if "/" in name or "\\" in name or name.startswith("."):
+        raise ProfileError("profile name %s can not be used as a file name" % name)
+
+    data = profile.get("data")
+    if not isinstance(data, list) or len(data) < 2:
+        raise ProfileError("profile %s needs at least two points" % name)
+    points = []
+    for point in data:
+        try:
+            (secs, temp) = point
+        except (TypeError, ValueError):
+            raise ProfileError("profile %s has a bad point %s" % (name, point))
+        for value in (secs, temp):
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise ProfileError("profile %s has a bad point %s" % (name, point))
+        if secs < 0:
+            raise ProfileError("profile %s has a point before time zero" % name)
+        points.append([secs, temp])
+
+    points.sort()
+    unique = [points[0]]
+    for point in points[1:]:
+        if point[0] == unique[-1][0]:
+            if point[1] != unique[-1][1]:
+                raise ProfileError("profile %s has two temperatures at %s seconds" % (name, point[0]))
+            continue
+        unique.append(point)
+    if len(unique) < 2:
+        raise ProfileError("profile %s needs at least two points" % name)
+
+    profile = dict(profile)
+    profile["data"] = unique
+    profile.pop("compiled", None)
+    profile = add_temp_units(profile)
+    if profile["temp_units"] == "f":
+        profile = convert_to_c(profile)
+        profile["temp_units"] = "c"
+    elif profile["temp_units"] != "c":
+        raise ProfileError("profile %s has unknown temp_units %s" % (name, profile["temp_units"]))
+
+    compiled = Profile(profile)
+    profile["compiled"] = {
+        "times": compiled.times,
+        "temps": compiled.temps,
+        "slopes": compiled.slopes,
+        "duration": compiled.duration,
+        "temp_units": "c",
+    }
+    return profile
+
+def add_temp_units(profile):
+    """
+    always store the temperature in degrees c
+    this way folks can share profiles
+    """
+    if "temp_units" in profile:
+        return profile
+    profile['temp_units']="c"
+    if config.temp_scale=="c":
+        return profile
+    if config.temp_scale=="f":
+        profile=convert_to_c(profile);
+        return profile
+
+def convert_to_c(profile):
+    # only happens before a profile is validated and compiled
+    profile.pop("compiled", None)
+    newdata=[]
+    for (secs,temp) in profile["data"]:
+        temp = (5/9)*(temp-32)
+        newdata.append((secs,temp))
+    profile["data"]=newdata
+    return profile
+
+def convert_to_f(profile):
+    newdata=[]
+    for (secs,temp) in profile["data"]:
+        temp = ((9/5)*temp)+32
+        newdata.append((secs,temp))
+    profile["data"]=newdata
+    if "compiled" in profile:
+        compiled = profile["compiled"]
+        profile["compiled"] = dict(compiled,
+            temps=[((9/5)*temp)+32 for temp in compiled["temps"]],
+            slopes=[(9/5)*slope for slope in compiled["slopes"]],
+            temp_units="f")
+    return profile
+
+def normalize_temp_units(profiles):
+    normalized = []
+    for profile in profiles:
+        if "temp_units" in profile:
+            if config.temp_scale == "f" and profile["temp_units"] == "c":
+                profile = convert_to_f(profile)
+                profile["temp_units"] = "f"
+        normalized.append(profile)
+    return normalized
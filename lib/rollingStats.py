@@ -0,0 +1,97 @@
+import collections
+
+class RollingWindow(object):
+    '''running sums of a few values over the last seconds of kiln time.
+    adding a sample and reading the sums do not depend on how many
+    samples are in the window.'''
+    def __init__(self, seconds, fields):
+        self.seconds = seconds
+        self.fields = fields
+        self.clear()
+
+    def clear(self):
+        # (time, values)
+        self.samples = collections.deque()
+        self.sums = [0.0] * self.fields
+        self.updates = 0
+
+    def add(self, t, values):
+        self.samples.append((t, values))
+        for i, v in enumerate(values):
+            self.sums[i] += v
+        while self.samples and self.samples[0][0] <= t - self.seconds:
+            old_t, old = self.samples.popleft()
+            for i, v in enumerate(old):
+                self.sums[i] -= v
+        # rebuild the sums now and then so rounding errors can not pile up
+        self.updates += 1
+        if self.updates >= max(100, len(self.samples)):
+            self.sums = [sum(values[i] for t, values in self.samples) for i in range(self.fields)]
+            self.updates = 0
+
+
+class RollingStats(object):
+    '''how well the kiln is following the schedule over the last few
+    minutes, worked out once on the server for every viewer. for each
+    window in seconds...
+
+        error                   average temperature - target
+        duty_cycle              average percent the elements were on
+        catching_up             percent of the time spent catching up
+        outside_window          seconds outside pid_control_window
+        outside_window_percent  percent of the time outside pid_control_window
+
+    time is kiln time from the pid, so simulations sped up with
+    sim_speedup_factor use simulated minutes.
+    '''
+    # dt, error*dt, out*dt, dt catching up, dt outside the window
+    FIELDS = 5
+
+    def __init__(self, windows, control_window):
+        self.control_window = control_window
+        self.windows = [RollingWindow(seconds, self.FIELDS) for seconds in windows]
+        self.clear()
+
+    def clear(self):
+        self.t = 0
+        self.last_pidstats = None
+        for window in self.windows:
+            window.clear()
+
+    def add(self, oven_state):
+        '''add one Oven.get_state(). only new pid computations count, so
+        this can be called more often than the pid runs.'''
+        pidstats = oven_state.get('pidstats')
+        if not pidstats or pidstats is self.last_pidstats:
+            return
+        self.last_pidstats = pidstats
+        dt = pidstats.get('timeDelta', 0)
+        if dt <= 0:
+            return
+        self.t += dt
+        err = pidstats['err']
+        values = (
+            dt,
+            -err * dt,
+            pidstats['out'] * dt,
+            dt if oven_state.get('catching_up') else 0,
+            dt if abs(err) > self.control_window else 0,
+        )
+        for window in self.windows:
+            window.add(self.t, values)
+
+    def get(self):
+        stats = {}
+        for window in self.windows:
+            covered, err, out, catching_up, outside = window.sums
+            if covered <= 0:
+                stats[str(window.seconds)] = None
+                continue
+            stats[str(window.seconds)] = {
+                'error': err / covered,
+                'duty_cycle': out / covered * 100,
+                'catching_up': catching_up / covered * 100,
+                'outside_window': outside,
+                'outside_window_percent': outside / covered * 100,
+            }
+        return stats
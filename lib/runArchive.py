@@ -0,0 +1,162 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from runHistory import RunHistory
+
+log = logging.getLogger(__name__)
+
+class RunArchive(object):
+    '''Every firing, kept forever in one sqlite file. There is a row per
+    run in the runs table with the kiln, profile, start and end time and
+    how it ended (complete, stopped, emergency or interrupted) and a row
+    per sample in the samples table. Samples are only ever appended and
+    are committed in batches of commit_every so the sd card is not
+    written on every tick. One archive can be shared by all kilns.
+    '''
+    SAMPLE_FIELDS = RunHistory.FIELDS
+
+    def __init__(self, path, commit_every=30):
+        self.path = path
+        self.commit_every = max(1, commit_every)
+        self.lock = threading.Lock()
+        # run_id -> [sample count, max temperature, cost] so far
+        self.open_runs = {}
+        self.uncommitted = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute('''CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kiln TEXT,
+                profile TEXT,
+                started REAL,
+                ended REAL,
+                outcome TEXT,
+                sample_count INTEGER DEFAULT 0,
+                cost REAL,
+                max_temperature REAL)''')
+            self.db.execute("CREATE INDEX IF NOT EXISTS runs_started ON runs (started)")
+            self.db.execute('''CREATE TABLE IF NOT EXISTS samples (
+                run_id INTEGER,
+                n INTEGER,
+                %s,
+                PRIMARY KEY (run_id, n)) WITHOUT ROWID''' %
+                ", ".join("%s REAL" % f for f in self.SAMPLE_FIELDS))
+            # runs that were going when the process stopped will never end
+            self.db.execute("UPDATE runs SET outcome = 'interrupted' WHERE outcome IS NULL")
+            self.db.commit()
+
+    def start_run(self, kiln, profile, started=None):
+        '''returns the run id'''
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT INTO runs (kiln, profile, started) VALUES (?, ?, ?)",
+                (kiln, profile, time.time() if started is None else started))
+            self.db.commit()
+            self.open_runs[cursor.lastrowid] = [0, None, None]
+            return cursor.lastrowid
+
+    def add_sample(self, run_id, state, now=None):
+        '''append one Oven.get_state() to a run'''
+        pidstats = state.get('pidstats') or {}
+        values = {
+            'time': time.time() if now is None else now,
+            'pid_err': pidstats.get('err'),
+            'pid_out': pidstats.get('out'),
+            'pid_p': pidstats.get('p'),
+            'pid_i': pidstats.get('i'),
+            'pid_d': pidstats.get('d'),
+        }
+        row = [values[f] if f in values else state.get(f) for f in self.SAMPLE_FIELDS]
+        with self.lock:
+            if run_id not in self.open_runs:
+                return
+            totals = self.open_runs[run_id]
+            n = totals[0]
+            totals[0] += 1
+            temperature = state.get('temperature')
+            if temperature is not None and (totals[1] is None or temperature > totals[1]):
+                totals[1] = temperature
+            totals[2] = state.get('cost')
+            self.db.execute("INSERT INTO samples VALUES (?, ?, %s)" %
+                ", ".join("?" for f in self.SAMPLE_FIELDS), [run_id, n] + row)
+            self.uncommitted += 1
+            if self.uncommitted >= self.commit_every:
+                self.commit()
+
+    def end_run(self, run_id, outcome, ended=None):
+        with self.lock:
+            if run_id not in self.open_runs:
+                return
+            self.update_totals(run_id)
+            del self.open_runs[run_id]
+            self.db.execute("UPDATE runs SET ended = ?, outcome = ? WHERE id = ?",
+                (time.time() if ended is None else ended, outcome, run_id))
+            self.commit()
+
+    def commit(self):
+        '''write out the samples so far and bring the run totals up to
+        date. the lock must be held.'''
+        for run_id in self.open_runs:
+            self.update_totals(run_id)
+        self.db.commit()
+        self.uncommitted = 0
+
+    def update_totals(self, run_id):
+        count, max_temperature, cost = self.open_runs[run_id]
+        self.db.execute("UPDATE runs SET sample_count = ?, max_temperature = ?, cost = ? WHERE id = ?",
+            (count, max_temperature, cost, run_id))
+
+    def list_runs(self, limit=100, before=None, profile=None, kiln=None):
+        '''the newest runs first, started before the unix time before'''
+        query = "SELECT * FROM runs WHERE 1=1"
+        args = []
+        if before is not None:
+            query += " AND started < ?"
+            args.append(before)
+        if profile:
+            query += " AND profile = ?"
+            args.append(profile)
+        if kiln:
+            query += " AND kiln = ?"
+            args.append(kiln)
+        query += " ORDER BY started DESC LIMIT ?"
+        args.append(limit)
+        with self.lock:
+            return [dict(row) for row in self.db.execute(query, args)]
+
+    def get_run(self, run_id):
+        '''the run as a dict, or None'''
+        with self.lock:
+            row = self.db.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+            return dict(row) if row else None
+
+    def get_samples(self, run_id, maxpts=None, fields=None):
+        '''the samples of a run in order. with maxpts, every nth sample so
+        there are at most maxpts.'''
+        fields = [f for f in (fields or self.SAMPLE_FIELDS) if f in self.SAMPLE_FIELDS]
+        with self.lock:
+            # uncommitted samples are visible to this connection
+            total = self.db.execute("SELECT MAX(n) + 1 FROM samples WHERE run_id = ?", (run_id,)).fetchone()[0] or 0
+            every_nth = 1
+            if maxpts and total > maxpts:
+                every_nth = -(-total // maxpts)
+            rows = self.db.execute(
+                "SELECT %s FROM samples WHERE run_id = ? AND n %% ? = 0 ORDER BY n" % ", ".join(fields),
+                (run_id, every_nth))
+            samples = [dict(row) for row in rows]
+        if 'catching_up' in fields:
+            for sample in samples:
+                sample['catching_up'] = sample['catching_up'] == 1
+        return samples
+
+    def close(self):
+        with self.lock:
+            self.commit()
+            self.db.close()
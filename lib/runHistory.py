@@ -0,0 +1,314 @@
+import os
+import time
+import array
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+class RunHistory(object):
+    '''The samples of one firing, stored by column: one array of doubles
+    per field instead of a dict per sample. At most max_samples are kept
+    in memory. When that fills up, the oldest half is appended to
+    spill_file and dropped from memory, so memory stays flat no matter
+    how long the firing is. Samples are numbered from the start of the
+    firing whether they are in memory or in the spill file. With no
+    spill_file the oldest samples are thrown away.
+
+    For sending a graph of the whole firing, the temperature is also
+    kept as at most max_buckets min/max buckets. Each bucket remembers
+    which samples were the coldest and hottest in it. When there are too
+    many buckets, neighbours are merged and the bucket width doubles, so
+    spikes and overshoots are never skipped over no matter how long the
+    firing gets.
+    '''
+    FIELDS = (
+        'time',
+        'runtime',
+        'temperature',
+        'target',
+        'heat',
+        'heat_rate',
+        'cost',
+        'catching_up',
+        'pid_err',
+        'pid_out',
+        'pid_p',
+        'pid_i',
+        'pid_d',
+    )
+    ROW_BYTES = len(FIELDS) * array.array('d').itemsize
+
+    def __init__(self, max_samples=7200, spill_file=None, max_buckets=512):
+        self.max_samples = max(2, max_samples)
+        self.spill_file = spill_file
+        # must be even so merging pairs always halves the buckets
+        self.max_buckets = max(2, max_buckets - max_buckets % 2)
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        '''forget everything, for the start of a new firing'''
+        with self.lock:
+            self.columns = {field: array.array('d') for field in self.FIELDS}
+            # samples before this index are not in memory
+            self.offset = 0
+            self.spilled = 0
+            self.bucket_width = 1
+            self.min_index = array.array('q')
+            self.min_value = array.array('d')
+            self.max_index = array.array('q')
+            self.max_value = array.array('d')
+            if self.spill_file and os.path.exists(self.spill_file):
+                os.remove(self.spill_file)
+
+    def __len__(self):
+        return self.offset + len(self.columns['time'])
+
+    def append(self, state, now=None):
+        '''add one Oven.get_state()'''
+        pidstats = state.get('pidstats') or {}
+        values = {
+            'time': time.time() if now is None else now,
+            'pid_err': pidstats.get('err'),
+            'pid_out': pidstats.get('out'),
+            'pid_p': pidstats.get('p'),
+            'pid_i': pidstats.get('i'),
+            'pid_d': pidstats.get('d'),
+        }
+        with self.lock:
+            for field in self.FIELDS:
+                value = values[field] if field in values else state.get(field)
+                if value is None:
+                    value = float('nan')
+                self.columns[field].append(float(value))
+            self.add_to_buckets(len(self) - 1, self.columns['temperature'][-1])
+            if len(self.columns['time']) >= self.max_samples:
+                self.spill(self.max_samples // 2)
+
+    def add_to_buckets(self, index, value):
+        bucket = index // self.bucket_width
+        if bucket == len(self.min_index):
+            self.min_index.append(index)
+            self.min_value.append(value)
+            self.max_index.append(index)
+            self.max_value.append(value)
+        else:
+            if value < self.min_value[bucket]:
+                self.min_index[bucket] = index
+                self.min_value[bucket] = value
+            if value > self.max_value[bucket]:
+                self.max_index[bucket] = index
+                self.max_value[bucket] = value
+        if len(self.min_index) > self.max_buckets:
+            self.merge_buckets()
+
+    def merge_buckets(self):
+        '''merge each pair of buckets and double the bucket width'''
+        min_index = array.array('q')
+        min_value = array.array('d')
+        max_index = array.array('q')
+        max_value = array.array('d')
+        for b in range(0, len(self.min_index), 2):
+            lo = b
+            hi = b
+            if b + 1 < len(self.min_index):
+                if self.min_value[b + 1] < self.min_value[b]:
+                    lo = b + 1
+                if self.max_value[b + 1] > self.max_value[b]:
+                    hi = b + 1
+            min_index.append(self.min_index[lo])
+            min_value.append(self.min_value[lo])
+            max_index.append(self.max_index[hi])
+            max_value.append(self.max_value[hi])
+        self.min_index = min_index
+        self.min_value = min_value
+        self.max_index = max_index
+        self.max_value = max_value
+        self.bucket_width *= 2
+
+    def decimated(self, maxpts=50):
+        '''indices of at most maxpts samples that keep the shape of the
+        temperature curve: the first and last sample plus the coldest
+        and hottest sample of each bucket. the work done depends on
+        max_buckets and maxpts, not on how long the firing is.'''
+        return self.window(None, None, maxpts)
+
+    def window(self, start=None, end=None, maxpts=50):
+        '''like decimated, but only for the samples with start <= time <=
+        end. either can be None for the start or end of the firing.'''
+        with self.lock:
+            total = len(self)
+            lo = self.first_index()
+            hi = total
+            if start is not None:
+                lo = self.find_time(start)
+            if end is not None:
+                hi = self.find_time(end, after=True)
+            if hi <= lo:
+                return []
+            if hi - lo <= maxpts:
+                return [i for i in range(lo, hi) if self.available(i)]
+
+            # two samples per group, plus the first and last sample
+            wanted = max(1, (maxpts - 2) // 2)
+            indices = set([lo, hi - 1])
+            width = self.bucket_width
+            # the buckets that are entirely inside the window
+            first = -(-lo // width)
+            last = len(self.min_index) if hi >= total else hi // width
+            if last - first >= wanted + 2:
+                # leave room for the partly covered buckets at each end
+                wanted = max(1, wanted - 2)
+                group = -(-(last - first) // wanted)
+                for b in range(first, last, group):
+                    low, high = self.min_max(b, min(b + group, last))
+                    indices.add(low)
+                    indices.add(high)
+                # the samples before the first and after the last whole
+                # bucket, at most a bucket width at each end
+                for a, b in ((lo, min(first * width, hi)), (max(last * width, lo), hi)):
+                    values = self.temperatures(a, b)
+                    if values:
+                        indices.add(min(values, key=lambda v: v[1])[0])
+                        indices.add(max(values, key=lambda v: v[1])[0])
+            else:
+                # a short window, look at the samples themselves
+                values = self.temperatures(lo, hi)
+                group = -(-len(values) // wanted)
+                for g in range(0, len(values), group):
+                    chunk = values[g:g + group]
+                    indices.add(min(chunk, key=lambda v: v[1])[0])
+                    indices.add(max(chunk, key=lambda v: v[1])[0])
+            return sorted(i for i in indices if self.available(i))
+
+    def min_max(self, first, last):
+        '''indices of the coldest and hottest samples in buckets first
+        up to last'''
+        lo = first
+        hi = first
+        for b in range(first + 1, last):
+            if self.min_value[b] < self.min_value[lo]:
+                lo = b
+            if self.max_value[b] > self.max_value[hi]:
+                hi = b
+        return self.min_index[lo], self.max_index[hi]
+
+    def available(self, i):
+        '''False if sample i was thrown away'''
+        return i < self.spilled or self.offset <= i < len(self)
+
+    def first_index(self):
+        return 0 if self.spilled else self.offset
+
+    def value(self, field, i):
+        '''one field of sample i, which must be available'''
+        if i >= self.offset:
+            return self.columns[field][i - self.offset]
+        values = array.array('d')
+        with open(self.spill_file, 'rb') as f:
+            f.seek(i * self.ROW_BYTES + self.FIELDS.index(field) * values.itemsize)
+            values.frombytes(f.read(values.itemsize))
+        return values[0]
+
+    def find_time(self, t, after=False):
+        '''index of the first sample with a time >= t, or > t if after'''
+        total = len(self)
+        # the samples in memory and the ones spilled to file, with a gap
+        # between them if any were thrown away
+        ranges = [(self.offset, total)]
+        if self.spilled:
+            ranges.insert(0, (0, self.spilled))
+        for lo, hi in ranges:
+            if hi <= lo:
+                continue
+            last = self.value('time', hi - 1)
+            if last < t or (after and last == t):
+                continue
+            while lo < hi:
+                mid = (lo + hi) // 2
+                v = self.value('time', mid)
+                if v < t or (after and v == t):
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return lo
+        return total
+
+    def temperatures(self, lo, hi):
+        '''(index, temperature) for the available samples from lo up to hi'''
+        values = []
+        column = self.FIELDS.index('temperature')
+        if lo < self.spilled:
+            end = min(hi, self.spilled)
+            rows = array.array('d')
+            with open(self.spill_file, 'rb') as f:
+                f.seek(lo * self.ROW_BYTES)
+                rows.frombytes(f.read((end - lo) * self.ROW_BYTES))
+            values.extend(zip(range(lo, end), rows[column::len(self.FIELDS)]))
+        start = max(lo, self.offset)
+        if start < hi:
+            temps = self.columns['temperature'][start - self.offset:hi - self.offset]
+            values.extend(zip(range(start, hi), temps))
+        return values
+
+    def spill(self, count):
+        '''move the oldest count samples out of memory. the spill file
+        only ever holds samples 0 up to spilled, so once a write fails
+        the samples are thrown away instead.'''
+        if self.spill_file and self.spilled == self.offset:
+            rows = array.array('d')
+            for i in range(count):
+                for field in self.FIELDS:
+                    rows.append(self.columns[field][i])
+            try:
+                os.makedirs(os.path.dirname(self.spill_file), exist_ok=True)
+                with open(self.spill_file, 'ab') as f:
+                    rows.tofile(f)
+                self.spilled += count
+            except OSError as e:
+                log.error("could not write run history to %s, older samples will be dropped: %s" % (self.spill_file, e))
+                try:
+                    # drop a partly written row
+                    os.truncate(self.spill_file, self.spilled * self.ROW_BYTES)
+                except OSError:
+                    pass
+        for field in self.FIELDS:
+            del self.columns[field][:count]
+        self.offset += count
+
+    def make_row(self, values):
+        # missing values are stored as nan, give them back as None so
+        # the row can be sent to a browser as json
+        row = {field: (None if value != value else value)
+               for field, value in zip(self.FIELDS, values)}
+        row['catching_up'] = row['catching_up'] == 1.0
+        return row
+
+    def rows(self, indices):
+        '''the samples at the given indices as dicts. samples that were
+        thrown away are skipped.'''
+        with self.lock:
+            result = []
+            f = None
+            try:
+                for i in indices:
+                    if i < 0:
+                        i += len(self)
+                    if i >= self.offset:
+                        j = i - self.offset
+                        if j < len(self.columns['time']):
+                            result.append(self.make_row(self.columns[field][j] for field in self.FIELDS))
+                    elif i < self.spilled:
+                        if f is None:
+                            f = open(self.spill_file, 'rb')
+                        f.seek(i * self.ROW_BYTES)
+                        values = array.array('d')
+                        values.frombytes(f.read(self.ROW_BYTES))
+                        result.append(self.make_row(values))
+            except OSError as e:
+                log.error("could not read run history from %s: %s" % (self.spill_file, e))
+            finally:
+                if f:
+                    f.close()
+            return result
@@ -0,0 +1,205 @@
+import json
+import logging
+import threading
+import collections
+import wireFormat
+
+log = logging.getLogger(__name__)
+
+# bump this when the snapshot or delta messages change shape
+STATUS_SCHEMA = 1
+
+def state_changes(old, new):
+    '''(changed, removed). changed has the fields of new that are not
+    the same in old, removed lists the fields that are gone. fields are
+    compared whole, a changed pidstats is sent whole.'''
+    changed = {}
+    for key, value in new.items():
+        if key not in old or old[key] != value:
+            changed[key] = value
+    removed = [key for key in old if key not in new]
+    return changed, removed
+
+
+class StatusClient(threading.Thread):
+    '''Sends messages to one websocket from its own thread. Messages wait
+    in a queue of at most max_queue. If the client can not keep up, the
+    oldest waiting message is dropped so a slow client only ever falls
+    behind by max_queue messages and never holds up anyone else.
+
+    A delta client gets a snapshot of the whole state and then only the
+    fields that changed. If a message is dropped, the next one is a
+    snapshot again so the client never misses a change.
+
+    fmt is json, msgpack or cbor, see wireFormat.
+    '''
+    def __init__(self, hub, wsock, max_queue=10, delta=False, fmt="json"):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.hub = hub
+        self.wsock = wsock
+        self.queue = collections.deque(maxlen=max(1, max_queue))
+        self.ready = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+        self.delta = delta
+        self.fmt = fmt
+        self.needs_snapshot = True
+
+    def put(self, message):
+        '''message is sent as is, or is the dict made by StatusHub.publish
+        with the state in each protocol and format'''
+        with self.ready:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+                self.needs_snapshot = True
+            self.queue.append(message)
+            self.ready.notify()
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            self.ready.notify()
+
+    def run(self):
+        while True:
+            with self.ready:
+                while not self.queue and not self.closed:
+                    self.ready.wait()
+                if self.closed:
+                    break
+                message = self.queue.popleft()
+                if isinstance(message, dict):
+                    if not self.delta:
+                        message = message[("full", self.fmt)]
+                    elif self.needs_snapshot:
+                        message = message[("snapshot", self.fmt)]
+                        self.needs_snapshot = False
+                    else:
+                        message = message[("delta", self.fmt)]
+            try:
+                self.wsock.send(message)
+            except Exception as e:
+                log.error("could not write to socket %s: %s" % (self.wsock, e))
+                self.hub.unsubscribe(self.wsock)
+                break
+        if self.dropped:
+            log.info("dropped %d messages for slow socket %s" % (self.dropped, self.wsock))
+
+
+class StatusHub(object):
+    '''Fans each status message out to every subscribed websocket. publish()
+    only puts the already serialized message on each client's queue, it
+    never waits on a socket.
+
+    Clients get the whole state as json in every message, or with
+    delta=True a numbered snapshot followed by only the changed fields...
+
+        {"type": "snapshot", "schema": 1, "seq": 7, "state": {...}}
+        {"type": "delta", "schema": 1, "seq": 8, "changed": {...}, "removed": [...]}
+
+    Each client can also get these as msgpack or cbor instead of json.
+    '''
+    def __init__(self, max_queue=10):
+        self.max_queue = max_queue
+        self.lock = threading.Lock()
+        self.clients = {}
+        self.seq = 0
+        self.last_state = {}
+        # the newest state for pollers, see latest()
+        self.version = 0
+        self.latest_json = None
+        self.latest_body = '{"seq": 0, "state": null}'
+        # called with no arguments each time the state changes
+        self.listeners = []
+
+    def __len__(self):
+        return len(self.clients)
+
+    def subscribe(self, wsock, first_message=None, delta=False, fmt="json"):
+        '''start sending to wsock. first_message, if given, is sent before
+        any published message and must already be in fmt'''
+        client = StatusClient(self, wsock, self.max_queue, delta, fmt)
+        if first_message is not None:
+            client.put(first_message)
+        with self.lock:
+            old = self.clients.pop(wsock, None)
+            self.clients[wsock] = client
+        if old:
+            old.close()
+        client.start()
+        return client
+
+    def latest(self):
+        '''(seq, json) of the newest state for pollers. seq only goes up
+        when the state is different from the one before, so it can be
+        used as an etag.'''
+        with self.lock:
+            return self.version, self.latest_body
+
+    def add_listener(self, listener):
+        '''listener() is called by publish() whenever the newest state
+        changes. it runs on the publishing thread, so it must not block.'''
+        with self.lock:
+            self.listeners.append(listener)
+
+    def unsubscribe(self, wsock):
+        with self.lock:
+            client = self.clients.pop(wsock, None)
+        if client:
+            client.close()
+
+    def publish(self, state):
+        '''send a state dict to every client. it is serialized once for
+        each protocol and format in use, not once per client. returns the
+        serialized messages keyed by (protocol, format).'''
+        with self.lock:
+            clients = list(self.clients.values())
+            self.seq += 1
+            seq = self.seq
+            last_state = self.last_state
+            self.last_state = state
+
+        full = json.dumps(state)
+        message = {("full", "json"): full}
+        listeners = []
+        with self.lock:
+            if full != self.latest_json:
+                self.version += 1
+                self.latest_json = full
+                self.latest_body = '{"seq": %d, "state": %s}' % (self.version, full)
+                listeners = list(self.listeners)
+        for listener in listeners:
+            listener()
+
+        for fmt in set(client.fmt for client in clients if not client.delta):
+            if fmt != "json":
+                message[("full", fmt)] = wireFormat.dumps(state, fmt)
+
+        delta_formats = set(client.fmt for client in clients if client.delta)
+        if delta_formats:
+            changed, removed = state_changes(last_state, state)
+            delta = {
+                "type": "delta",
+                "schema": STATUS_SCHEMA,
+                "seq": seq,
+                "changed": changed,
+                "removed": removed,
+            }
+            for fmt in delta_formats:
+                if fmt == "json":
+                    # the state is already json, no need to do it again
+                    message[("snapshot", fmt)] = '{"type": "snapshot", "schema": %d, "seq": %d, "state": %s}' % (
+                        STATUS_SCHEMA, seq, full)
+                else:
+                    message[("snapshot", fmt)] = wireFormat.dumps({
+                        "type": "snapshot",
+                        "schema": STATUS_SCHEMA,
+                        "seq": seq,
+                        "state": state,
+                    }, fmt)
+                message[("delta", fmt)] = wireFormat.dumps(delta, fmt)
+
+        for client in clients:
+            client.put(message)
+        return message
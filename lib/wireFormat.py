@@ -0,0 +1,53 @@
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+# msgpack and cbor are optional. without them every client gets json.
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+def available():
+    '''the formats that can be used on this install'''
+    formats = ["json"]
+    if msgpack:
+        formats.append("msgpack")
+    if cbor2:
+        formats.append("cbor")
+    return formats
+
+def choose(requested):
+    '''the format to send to a client that asked for requested, which
+    is json unless msgpack or cbor was asked for and is installed'''
+    if not requested or requested == "json":
+        return "json"
+    if requested in available():
+        return requested
+    log.warning("%s was asked for but is not available, sending json" % requested)
+    return "json"
+
+def dumps(obj, fmt="json"):
+    '''obj as a str for json, or as bytes for msgpack and cbor so the
+    websocket sends it as a binary message'''
+    if fmt == "msgpack":
+        return msgpack.packb(obj, use_bin_type=True)
+    if fmt == "cbor":
+        return cbor2.dumps(obj)
+    return json.dumps(obj)
+
+def loads(message, fmt="json"):
+    '''decode a message from a client. text messages are always json'''
+    if isinstance(message, (bytes, bytearray)):
+        if fmt == "msgpack":
+            return msgpack.unpackb(message, raw=False)
+        if fmt == "cbor":
+            return cbor2.loads(message)
+        message = message.decode("utf-8")
+    return json.loads(message)
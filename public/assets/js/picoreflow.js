@@ -19,9 +19,15 @@ if (window.location.protocol == 'https:') {
     protocol = 'wss:';
 }
 var host = "" + protocol + "//" + window.location.hostname + ":" + window.location.port;
-var ws_status = new WebSocket(host+"/status");
-var ws_control = new WebSocket(host+"/control");
-var ws_config = new WebSocket(host+"/config");
+// with more than one kiln, /?kiln=<kiln id> picks which kiln this page runs
+var kiln_path = "";
+var kiln_match = window.location.search.match(/[?&]kiln=([^&]+)/);
+if (kiln_match) {
+    kiln_path = "/kiln/" + kiln_match[1];
+}
+var ws_status = new WebSocket(host+kiln_path+"/status");
+var ws_control = new WebSocket(host+kiln_path+"/control");
+var ws_config = new WebSocket(host+kiln_path+"/config");
 var ws_storage = new WebSocket(host+"/storage");
 
 
@@ -673,6 +679,21 @@ $(document).ready(function()
                     }
                 }
 
+                if(message.resp == "ERROR")
+                {
+                    // the profile was not saved, say why
+                    $.bootstrapGrowl("<span class=\"glyphicon glyphicon-exclamation-sign\"></span> <b>Profile not saved:</b><br/>" + $('<div>').text(message.error).html(), {
+                    ele: 'body', // which element to append to
+                    type: 'alert', // (null, 'info', 'error', 'success')
+                    offset: {from: 'top', amount: 250}, // 'top', or 'bottom'
+                    align: 'center', // ('left', 'right', or 'center')
+                    width: 385, // (integer, or 'auto')
+                    delay: 5000,
+                    allow_dismiss: true,
+                    stackup_spacing: 10 // spacing between consecutively stacked growls.
+                    });
+                }
+
                 return;
             }
 
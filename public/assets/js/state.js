@@ -7,8 +7,14 @@ if (window.location.protocol == 'https:') {
   protocol = 'wss:';
   }
 var host = "" + protocol + "//" + window.location.hostname + ":" + window.location.port;
-var ws_status = new WebSocket(host+"/status");
-var ws_config = new WebSocket(host+"/config");
+// with more than one kiln, /state?kiln=<kiln id> picks which kiln to show
+var kiln_path = "";
+var kiln_match = window.location.search.match(/[?&]kiln=([^&]+)/);
+if (kiln_match) {
+  kiln_path = "/kiln/" + kiln_match[1];
+  }
+var ws_status = new WebSocket(host+kiln_path+"/status");
+var ws_config = new WebSocket(host+kiln_path+"/config");
 
 ws_status.onmessage = function(e) {
   x = JSON.parse(e.data);
@@ -28,16 +34,30 @@ ws_status.onmessage = function(e) {
   drawall(all);
 
   document.getElementById("error-current").innerHTML = rnd(x.pidstats.err);
-  document.getElementById("error-1min").innerHTML = rnd(average("err",1,all));
-  document.getElementById("error-5min").innerHTML = rnd(average("err",5,all));
-  document.getElementById("error-15min").innerHTML = rnd(average("err",15,all));
-  
+  // the server keeps these up to date, only work them out here if it
+  // has not got any yet
+  if (x.stats && x.stats["60"] && x.stats["300"] && x.stats["900"]) {
+    document.getElementById("error-1min").innerHTML = rnd(x.stats["60"].error);
+    document.getElementById("error-5min").innerHTML = rnd(x.stats["300"].error);
+    document.getElementById("error-15min").innerHTML = rnd(x.stats["900"].error);
+    }
+  else {
+    document.getElementById("error-1min").innerHTML = rnd(average("err",1,all));
+    document.getElementById("error-5min").innerHTML = rnd(average("err",5,all));
+    document.getElementById("error-15min").innerHTML = rnd(average("err",15,all));
+    }
+
   document.getElementById("temp").innerHTML = rnd(x.pidstats.ispoint);
   document.getElementById("target").innerHTML = rnd(x.pidstats.setpoint);
 
   document.getElementById("heat-pct").innerHTML = rnd(x.pidstats.out);
 
-  document.getElementById("catching-up").innerHTML = rnd(percent_catching_up(all));
+  if (x.stats && x.stats["900"]) {
+    document.getElementById("catching-up").innerHTML = rnd(x.stats["900"].catching_up);
+    }
+  else {
+    document.getElementById("catching-up").innerHTML = rnd(percent_catching_up(all));
+    }
   };
 
 ws_config.onopen = function() {